@@ -26,7 +26,8 @@ setup(
             "pytest>=7.0.0,<9.0.0",
             "black>=23.0.0,<26.0.0",
             "mypy>=1.0.0,<2.0.0",
-            "pytest-asyncio>=0.21.0,<1.1.0",
+            "pytest-asyncio>=0.26.0,<1.1.0",
+            "pytest-xdist>=3.0.0,<4.0.0",
             "ruff>=0.1.0,<0.13.0",
             "types-requests>=2.31.0,<3.0.0",
         ],
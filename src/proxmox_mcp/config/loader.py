@@ -15,11 +15,36 @@ like API tokens can be stored encrypted in the configuration file.
 
 import json
 import os
-from typing import Optional
+from typing import Iterator, Optional, Tuple
 
 from ..utils.encryption import TokenEncryption
 from .models import Config
 
+# (section, field) paths of configuration values that may be stored encrypted.
+# Encryption, decryption and the encrypt_config key rotation all walk this
+# table through iter_sensitive_values(), so a new sensitive field only needs
+# adding here, e.g. ("database", "password").
+_ENCRYPTED_PATHS = (("auth", "token_value"),)
+
+
+def iter_sensitive_values(
+    config_data: dict, encrypted: bool = True
+) -> Iterator[Tuple[str, str, str]]:
+    """Yield (section, field, value) for sensitive values in a config.
+
+    Args:
+        config_data: Raw configuration dictionary from JSON
+        encrypted: Yield values carrying the "enc:" prefix when True,
+            plain-text values when False
+
+    Yields:
+        Tuples of section name, field name and the stored string value
+    """
+    for section, field in _ENCRYPTED_PATHS:
+        value = config_data.get(section, {}).get(field)
+        if isinstance(value, str) and value.startswith("enc:") == encrypted:
+            yield section, field, value
+
 
 def load_config(config_path: Optional[str] = None) -> Config:
     """Load and validate configuration from JSON file.
@@ -114,21 +139,13 @@ def _decrypt_config_tokens(config_data: dict) -> dict:
     # Only initialize encryption if we find encrypted values
     encryptor = None
 
-    # Check and decrypt auth.token_value if encrypted
-    if "auth" in config_data and "token_value" in config_data["auth"]:
-        token_value = config_data["auth"]["token_value"]
-        if isinstance(token_value, str) and token_value.startswith("enc:"):
-            try:
-                if encryptor is None:
-                    encryptor = TokenEncryption()
-                config_data["auth"]["token_value"] = encryptor.decrypt_token(
-                    token_value
-                )
-            except Exception as e:
-                _handle_decryption_error("auth.token_value", token_value, e)
-
-    # Future: Add support for other encrypted fields here
-    # e.g., database passwords, API keys, etc.
+    for section, field, value in list(iter_sensitive_values(config_data)):
+        try:
+            if encryptor is None:
+                encryptor = TokenEncryption()
+            config_data[section][field] = encryptor.decrypt_token(value)
+        except Exception as e:
+            _handle_decryption_error(f"{section}.{field}", value, e)
 
     return config_data
 
@@ -219,12 +236,10 @@ def encrypt_config_file(config_path: str, output_path: Optional[str] = None) ->
         encryptor = TokenEncryption()
 
         # Encrypt sensitive values
-        if "auth" in config_data and "token_value" in config_data["auth"]:
-            token_value = config_data["auth"]["token_value"]
-            if isinstance(token_value, str) and not encryptor.is_encrypted(token_value):
-                config_data["auth"]["token_value"] = encryptor.encrypt_token(
-                    token_value
-                )
+        for section, field, value in list(
+            iter_sensitive_values(config_data, encrypted=False)
+        ):
+            config_data[section][field] = encryptor.encrypt_token(value)
 
         # Write encrypted config
         with open(output_path, "w") as f:
@@ -34,6 +34,9 @@ class VMConsoleManager:
     - Comprehensive error handling
     """
 
+    # Seconds to let a guest agent command run before polling exec-status
+    COMMAND_COMPLETION_WAIT = 1.0
+
     def __init__(self, proxmox_api: Any) -> None:
         """Initialize the VM console manager.
 
@@ -74,7 +77,7 @@ class VMConsoleManager:
         import asyncio
         
         self.logger.info(f"Waiting for command completion (PID: {pid})...")
-        await asyncio.sleep(1)  # Allow command to complete
+        await asyncio.sleep(self.COMMAND_COMPLETION_WAIT)  # Allow command to complete
         
         endpoint = self.proxmox.nodes(node).qemu(vmid).agent
         try:
@@ -33,9 +33,12 @@ from typing import List, Optional
 # Add the src directory to the path so we can import our modules
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
-from proxmox_mcp.config.loader import encrypt_config_file
+from proxmox_mcp.config.loader import encrypt_config_file, iter_sensitive_values
 from proxmox_mcp.utils.encryption import TokenEncryption
 
+# ANSI erase-display + cursor-home; also understood by modern Windows consoles
+_CLEAR_SEQUENCE = "\033[2J\033[H"
+
 
 def clear_terminal_if_requested() -> None:
     """Offer to clear terminal for security after key operations."""
@@ -49,13 +52,13 @@ def clear_terminal_if_requested() -> None:
 
                     ctypes.windll.kernel32.SetConsoleTitleW("ProxmoxMCP")  # type: ignore
                     # Clear screen using ANSI escape sequences (works on modern Windows)
-                    print("\033[2J\033[H", end="", flush=True)
+                    print(_CLEAR_SEQUENCE, end="", flush=True)
                 except Exception:
                     # Fallback: just print newlines to push content up
                     print("\n" * 50)
             else:
                 # Use ANSI escape sequences directly
-                print("\033[2J\033[H", end="", flush=True)
+                print(_CLEAR_SEQUENCE, end="", flush=True)
             print("✅ Terminal cleared for security")
             print("💡 Consider also clearing your shell history if needed")
         else:
@@ -208,18 +211,13 @@ def verify_config_decryption(config_path: str, old_key: str) -> bool:
         with open(config_path) as f:
             config_data = json.load(f)
 
-        # Check if there are any encrypted tokens
-        if "auth" in config_data and "token_value" in config_data["auth"]:
-            token_value = config_data["auth"]["token_value"]
-            if isinstance(token_value, str) and token_value.startswith("enc:"):
-                # Try to decrypt the token
-                try:
-                    old_encryptor.decrypt_token(token_value)
-                    return True
-                except Exception:
-                    return False
+        # Every encrypted value must decrypt; a config without any passes
+        for _section, _field, value in iter_sensitive_values(config_data):
+            try:
+                old_encryptor.decrypt_token(value)
+            except Exception:
+                return False
 
-        # If no encrypted tokens found, assume verification passed
         return True
 
     except Exception:
@@ -314,16 +312,11 @@ def _perform_token_rotation(config_path: str, old_key: str, new_key: str) -> Lis
     # Track what was rotated
     rotated_fields: List[str] = []
 
-    # Rotate token_value if encrypted
-    if "auth" in config_data and "token_value" in config_data["auth"]:
-        token_value = config_data["auth"]["token_value"]
-        if isinstance(token_value, str) and token_value.startswith("enc:"):
-            # Decrypt with old key and re-encrypt with new key
-            decrypted_token = old_encryptor.decrypt_token(token_value)
-            config_data["auth"]["token_value"] = new_encryptor.encrypt_token(
-                decrypted_token
-            )
-            rotated_fields.append("auth.token_value")
+    # Decrypt each encrypted value with the old key and re-encrypt with the new key
+    for section, field, value in list(iter_sensitive_values(config_data)):
+        decrypted_value = old_encryptor.decrypt_token(value)
+        config_data[section][field] = new_encryptor.encrypt_token(decrypted_value)
+        rotated_fields.append(f"{section}.{field}")
 
     # Save rotated configuration
     with open(config_path, "w") as f:
@@ -475,13 +468,7 @@ def _process_single_config(config_file: str, new_key: str) -> bool:
         with open(config_file) as f:
             config_data = json.load(f)
 
-        has_encrypted_content = False
-        if "auth" in config_data and "token_value" in config_data["auth"]:
-            token_value = config_data["auth"]["token_value"]
-            if isinstance(token_value, str) and token_value.startswith("enc:"):
-                has_encrypted_content = True
-
-        if not has_encrypted_content:
+        if next(iter_sensitive_values(config_data), None) is None:
             print("   ⏭️  Skipping (no encrypted content)")
             return True  # Not an error, just nothing to do
 
@@ -16,13 +16,59 @@ Security features:
 """
 
 import base64
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property, lru_cache
 import os
-from typing import Optional
+from typing import ClassVar, Dict, Iterable, List, Optional
 
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, InvalidToken
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 
+# PBKDF2 iteration count per envelope version. Version 1 (the unversioned
+# 'enc:' formats) stretches the master key for the case where it is a
+# low-entropy secret. Version 2 is only emitted for full-size random master
+# keys, which gain nothing from stretching.
+_KDF_ITERATIONS = {"v1": 100000, "v2": 1}
+
+# Decoded master keys at least this long are treated as high-entropy keys
+# (generate_master_key() produces 32 random bytes). Length is the only signal
+# available, so a hand-picked key of this size would also skip stretching;
+# only keys from generate_master_key() / --generate-key are supported.
+_HIGH_ENTROPY_KEY_BYTES = 32
+
+# Upper bound on memoized stretched (v1) key derivations. Every token carries
+# its own salt, so this only pays off for repeated work on the same tokens
+# (rotation, verification, re-reading a config); the static legacy salt takes
+# one slot. Single-round v2 derivations are cheap and never cached, so their
+# key material is not retained.
+_DERIVED_KEY_CACHE_SIZE = 256
+
+
+@lru_cache(maxsize=_DERIVED_KEY_CACHE_SIZE)
+def _derive_key(key_bytes: bytes, salt: bytes, iterations: int) -> bytes:
+    """Derive a Fernet key from raw master key bytes using PBKDF2-HMAC-SHA256.
+
+    PBKDF2 is deterministic, so results are memoized per
+    (key, salt, iterations) to avoid re-deriving the same Fernet key. Callers
+    use ``_derive_key.__wrapped__`` for unstretched derivations.
+
+    Args:
+        key_bytes: Decoded master key
+        salt: Salt for key derivation
+        iterations: PBKDF2 iteration count
+
+    Returns:
+        URL-safe base64-encoded 32-byte Fernet key
+    """
+    kdf = PBKDF2HMAC(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=salt,
+        iterations=iterations,
+    )
+    return base64.urlsafe_b64encode(kdf.derive(key_bytes))
+
 
 class TokenEncryption:
     """Handles encryption and decryption of sensitive tokens.
@@ -40,16 +86,38 @@ class TokenEncryption:
         decrypted_token = encryptor.decrypt_token(encrypted_token)
     """
 
+    # Shared encryptor for the current PROXMOX_MCP_MASTER_KEY value. Holds at
+    # most one entry, so a rotated-out key's encryptor is released; stretched
+    # derivations made with that key stay in _derive_key's cache until
+    # clear_default() or eviction.
+    _default_cache: ClassVar[Dict[Optional[str], "TokenEncryption"]] = {}
+
     def __init__(self, master_key: Optional[str] = None):
         """Initialize the encryption handler.
 
         Args:
             master_key: Optional master key for encryption. If not provided,
                        will attempt to load from PROXMOX_MCP_MASTER_KEY
-                       environment variable, or generate a new one.
+                       environment variable, or generate a new one. Must be
+                       a key from generate_master_key(): 32-byte keys are
+                       assumed random and are not stretched.
         """
         self._master_key = master_key or self._get_or_generate_master_key()
-        self._cipher = self._create_cipher()
+
+        try:
+            key_size = len(base64.urlsafe_b64decode(self._master_key.encode()))
+        except ValueError as e:
+            raise ValueError(f"Invalid master key: {e}") from e
+        self._envelope_version = "v2" if key_size >= _HIGH_ENTROPY_KEY_BYTES else "v1"
+
+    @cached_property
+    def _cipher(self) -> Fernet:
+        """Static-salt cipher for old-format tokens, derived on first use.
+
+        Only 'enc:{encrypted_data_b64}' tokens need it, so instances that never
+        see one skip its full-strength key derivation.
+        """
+        return self._create_cipher()
 
     def _get_or_generate_master_key(self) -> str:
         """Get master key from environment or generate a new one.
@@ -72,6 +140,7 @@ class TokenEncryption:
         print("   A temporary key has been generated for this session only.")
         print("   To generate and set a permanent master key:")
         print("   1. Run: python -m proxmox_mcp.utils.encrypt_config --generate-key")
+        print("      (only generated keys are supported; do not pick one by hand)")
         print(
             "   2. Copy the key to your environment: export PROXMOX_MCP_MASTER_KEY=<key>"
         )
@@ -85,12 +154,16 @@ class TokenEncryption:
         # Return the generated key for this session but don't expose it in logs
         return new_key
 
-    def _create_cipher(self, salt: Optional[bytes] = None) -> Fernet:
+    def _create_cipher(
+        self, salt: Optional[bytes] = None, iterations: Optional[int] = None
+    ) -> Fernet:
         """Create Fernet cipher from master key with optional salt.
 
         Args:
             salt: Optional salt for key derivation. If not provided, uses static salt
                   for backward compatibility.
+            iterations: PBKDF2 iteration count for the envelope version in use.
+                        Defaults to the version 1 count.
 
         Returns:
             Fernet cipher instance
@@ -106,54 +179,58 @@ class TokenEncryption:
             if salt is None:
                 salt = b"proxmox_mcp_salt"  # Static salt for backward compatibility
 
-            # Use PBKDF2 to derive a proper Fernet key from the master key
-            kdf = PBKDF2HMAC(
-                algorithm=hashes.SHA256(),
-                length=32,
-                salt=salt,
-                iterations=100000,
-            )
-            fernet_key = base64.urlsafe_b64encode(kdf.derive(key_bytes))
+            if iterations is None:
+                iterations = _KDF_ITERATIONS["v1"]
 
-            return Fernet(fernet_key)
+            # Use PBKDF2 to derive a proper Fernet key from the master key;
+            # only the stretched derivation is worth memoizing
+            derive = _derive_key if iterations > 1 else _derive_key.__wrapped__
+            return Fernet(derive(key_bytes, salt, iterations))
         except Exception as e:
             raise ValueError(f"Invalid master key: {e}") from e
 
     def encrypt_token(self, token: str) -> str:
         """Encrypt a token for secure storage with unique salt.
 
+        High-entropy master keys produce 'enc:v2:{salt_b64}:{encrypted_data_b64}';
+        shorter master keys keep the stretched 'enc:{salt_b64}:{encrypted_data_b64}'
+        format.
+
         Args:
             token: Plain text token to encrypt
 
         Returns:
-            Base64-encoded encrypted token with format 'enc:{salt_b64}:{encrypted_data_b64}'
+            Base64-encoded encrypted token with 'enc:' prefix
 
         Raises:
             ValueError: If token cannot be encrypted
         """
-        try:
-            # Generate a unique salt for this encryption
-            unique_salt = os.urandom(16)  # 16 bytes = 128 bits of salt
-
-            # Create cipher with unique salt
-            cipher = self._create_cipher(unique_salt)
+        # Generate a unique salt for this encryption
+        unique_salt = os.urandom(16)  # 16 bytes = 128 bits of salt
+        version = self._envelope_version
 
-            # Encrypt the token
+        try:
+            # Create cipher with unique salt and encrypt the token
+            cipher = self._create_cipher(unique_salt, _KDF_ITERATIONS[version])
             encrypted_bytes = cipher.encrypt(token.encode())
+        except (AttributeError, TypeError, ValueError) as e:
+            raise ValueError(f"Failed to encrypt token: {e}") from e
 
-            # Encode salt and encrypted data
-            salt_b64 = base64.urlsafe_b64encode(unique_salt).decode()
-            encrypted_b64 = base64.urlsafe_b64encode(encrypted_bytes).decode()
+        # Encode salt and encrypted data; base64 output is ASCII, so build
+        # the envelope as bytes and decode once at the end
+        salt_b64 = base64.urlsafe_b64encode(unique_salt)
+        encrypted_b64 = base64.urlsafe_b64encode(encrypted_bytes)
 
-            return f"enc:{salt_b64}:{encrypted_b64}"
-        except Exception as e:
-            raise ValueError(f"Failed to encrypt token: {e}") from e
+        prefix = b"enc:v2:" if version == "v2" else b"enc:"
+        return (prefix + salt_b64 + b":" + encrypted_b64).decode("ascii")
 
     def decrypt_token(self, encrypted_token: str) -> str:
         """Decrypt an encrypted token with backward compatibility.
 
-        Supports both formats:
-        - New format: 'enc:{salt_b64}:{encrypted_data_b64}' (unique salt per token)
+        Supports all formats:
+        - Versioned format: 'enc:v2:{salt_b64}:{encrypted_data_b64}' (unique salt,
+          single-round key derivation for high-entropy master keys)
+        - Salted format: 'enc:{salt_b64}:{encrypted_data_b64}' (unique salt per token)
         - Old format: 'enc:{encrypted_data_b64}' (static salt for backward compatibility)
 
         Args:
@@ -165,43 +242,42 @@ class TokenEncryption:
         Raises:
             ValueError: If token cannot be decrypted or is invalid format
         """
-        try:
-            # Check if token is encrypted (has 'enc:' prefix)
-            if not encrypted_token.startswith("enc:"):
-                # Token is not encrypted, return as-is (for backward compatibility)
-                return encrypted_token
-
-            # Remove 'enc:' prefix
-            token_parts = encrypted_token[4:].split(":")
-
-            if len(token_parts) == 2:
-                # New format: enc:{salt_b64}:{encrypted_data_b64}
-                salt_b64, encrypted_b64 = token_parts
+        # Check if token is encrypted (has 'enc:' prefix)
+        if not encrypted_token.startswith("enc:"):
+            # Token is not encrypted, return as-is (for backward compatibility)
+            return encrypted_token
+
+        # Remove 'enc:' prefix and pick the key derivation for the format
+        token_parts = encrypted_token[4:].split(":")
+        salt_b64: Optional[str] = None
+        iterations = _KDF_ITERATIONS["v1"]
+
+        if len(token_parts) == 3 and token_parts[0] in _KDF_ITERATIONS:
+            # Versioned format: enc:v{N}:{salt_b64}:{encrypted_data_b64}
+            version, salt_b64, encrypted_b64 = token_parts
+            iterations = _KDF_ITERATIONS[version]
+        elif len(token_parts) == 2:
+            # Salted format: enc:{salt_b64}:{encrypted_data_b64}
+            salt_b64, encrypted_b64 = token_parts
+        elif len(token_parts) == 1:
+            # Old format: enc:{encrypted_data_b64} (backward compatibility)
+            encrypted_b64 = token_parts[0]
+        else:
+            raise ValueError("Failed to decrypt token: Invalid encrypted token format")
 
-                # Decode salt and encrypted data
-                salt = base64.urlsafe_b64decode(salt_b64.encode())
-                encrypted_bytes = base64.urlsafe_b64decode(encrypted_b64.encode())
-
-                # Create cipher with the stored salt
-                cipher = self._create_cipher(salt)
-
-                # Decrypt and return
-                decrypted_bytes = cipher.decrypt(encrypted_bytes)
-                return decrypted_bytes.decode()
-
-            elif len(token_parts) == 1:
-                # Old format: enc:{encrypted_data_b64} (backward compatibility)
-                encrypted_b64 = token_parts[0]
-                encrypted_bytes = base64.urlsafe_b64decode(encrypted_b64.encode())
+        try:
+            encrypted_bytes = base64.urlsafe_b64decode(encrypted_b64.encode())
 
+            if salt_b64 is None:
                 # Use default cipher with static salt for backward compatibility
-                decrypted_bytes = self._cipher.decrypt(encrypted_bytes)
-                return decrypted_bytes.decode()
-
+                cipher = self._cipher
             else:
-                raise ValueError("Invalid encrypted token format")
+                # Create cipher with the stored salt
+                salt = base64.urlsafe_b64decode(salt_b64.encode())
+                cipher = self._create_cipher(salt, iterations)
 
-        except Exception as e:
+            return cipher.decrypt(encrypted_bytes).decode()
+        except (InvalidToken, ValueError) as e:
             raise ValueError(f"Failed to decrypt token: {e}") from e
 
     def is_encrypted(self, token: str) -> bool:
@@ -231,6 +307,57 @@ class TokenEncryption:
         # Encrypt the plain token
         return self.encrypt_token(plain_token)
 
+    def migrate_batch(
+        self, tokens: Iterable[str], max_workers: Optional[int] = None
+    ) -> List[str]:
+        """Migrate many plain text tokens to encrypted format in parallel.
+
+        Each token uses its own salt, so key derivation is independent per
+        token. PBKDF2 runs inside OpenSSL with the GIL released, which lets
+        a thread pool scale across cores.
+
+        Args:
+            tokens: Plain text (or already encrypted) tokens to migrate
+            max_workers: Optional worker count. Defaults to the CPU count.
+
+        Returns:
+            Encrypted tokens in the same order as the input
+        """
+        with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+            return list(executor.map(self.migrate_plain_token, tokens))
+
+    @classmethod
+    def default(cls) -> "TokenEncryption":
+        """Get the shared encryptor for the current environment master key.
+
+        The instance is memoized for the current PROXMOX_MCP_MASTER_KEY value,
+        so key derivation runs once per process. When the environment key
+        changes, the old encryptor is dropped and a new one is built.
+
+        With no environment key, the temporary key generated on first use is
+        shared by every caller of default() and the *_sensitive_value
+        helpers until clear_default() is called or the process exits.
+
+        Returns:
+            TokenEncryption instance for the current environment key
+        """
+        env_key = os.getenv("PROXMOX_MCP_MASTER_KEY")
+        encryptor = cls._default_cache.get(env_key)
+        if encryptor is None:
+            cls._default_cache.clear()
+            encryptor = cls._default_cache[env_key] = cls(env_key)
+        return encryptor
+
+    @classmethod
+    def clear_default(cls) -> None:
+        """Forget the shared encryptor and every memoized key derivation.
+
+        This drops the temporary session key held by the shared encryptor and
+        any stretched key material cached for it or for other master keys.
+        """
+        cls._default_cache.clear()
+        _derive_key.cache_clear()
+
     @staticmethod
     def generate_master_key() -> str:
         """Generate a new master key for encryption.
@@ -248,13 +375,15 @@ def encrypt_sensitive_value(
 
     Args:
         value: Sensitive value to encrypt
-        encryptor: Optional TokenEncryption instance. If not provided, creates new one.
+        encryptor: Optional TokenEncryption instance. If not provided, uses the
+                   shared instance from TokenEncryption.default(), whose
+                   temporary key (when no env key is set) is process-wide.
 
     Returns:
         Encrypted value
     """
     if encryptor is None:
-        encryptor = TokenEncryption()
+        encryptor = TokenEncryption.default()
     return encryptor.encrypt_token(value)
 
 
@@ -265,11 +394,13 @@ def decrypt_sensitive_value(
 
     Args:
         encrypted_value: Encrypted value to decrypt
-        encryptor: Optional TokenEncryption instance. If not provided, creates new one.
+        encryptor: Optional TokenEncryption instance. If not provided, uses the
+                   shared instance from TokenEncryption.default(), whose
+                   temporary key (when no env key is set) is process-wide.
 
     Returns:
         Decrypted value
     """
     if encryptor is None:
-        encryptor = TokenEncryption()
+        encryptor = TokenEncryption.default()
     return encryptor.decrypt_token(encrypted_value)
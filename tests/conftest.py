@@ -0,0 +1,174 @@
+"""
+Shared fixtures for the Proxmox MCP test suite.
+"""
+
+from unittest.mock import patch
+
+import pytest
+
+from proxmox_mcp.tools.console import VMConsoleManager
+from proxmox_mcp.utils import encryption
+
+# PBKDF2 work factor for the stretched (v1) token formats during tests. The
+# production count exists to resist brute force, which unit tests do not
+# exercise; round trips and salt uniqueness hold for any count.
+_TEST_KDF_ITERATIONS = 1000
+
+# The shipped iteration counts, captured before _fast_kdf patches them
+_PRODUCTION_KDF_ITERATIONS = dict(encryption._KDF_ITERATIONS)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _fast_kdf():
+    """Lower the v1 PBKDF2 iteration count for the whole session."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setitem(encryption._KDF_ITERATIONS, "v1", _TEST_KDF_ITERATIONS)
+        yield
+
+
+@pytest.fixture
+def production_kdf(monkeypatch):
+    """Restore the shipped PBKDF2 iteration counts for a single test."""
+    for version, iterations in _PRODUCTION_KDF_ITERATIONS.items():
+        monkeypatch.setitem(encryption._KDF_ITERATIONS, version, iterations)
+
+
+@pytest.fixture(scope="session")
+def key_pool():
+    """Pre-generated master keys shared across the session."""
+    return [encryption.TokenEncryption.generate_master_key() for _ in range(8)]
+
+
+@pytest.fixture(scope="session")
+def encrypted_fixture():
+    """Master key and a 'test-token' encrypted with it, built once per session."""
+    key = encryption.TokenEncryption.generate_master_key()
+    encryptor = encryption.TokenEncryption(master_key=key)
+    return key, encryptor.encrypt_token("test-token")  # nosec: test credential
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _prewarm_crypto(_fast_kdf):
+    """Run one encrypt/decrypt round trip before any test.
+
+    The OpenSSL backend and Fernet/PBKDF2 code paths initialize lazily, so
+    without this the first encryption test absorbs that one-off cost.
+    """
+    encryptor = encryption.TokenEncryption(
+        master_key=encryption.TokenEncryption.generate_master_key()
+    )
+    encryptor.decrypt_token(encryptor.encrypt_token("warm"))
+
+
+@pytest.fixture(autouse=True)
+def _clear_default_encryptor():
+    """Drop the shared TokenEncryption.default() instance after each test."""
+    yield
+    encryption.TokenEncryption.clear_default()
+
+
+@pytest.fixture(autouse=True)
+def _instant_command_completion(monkeypatch):
+    """Skip the real wait for guest agent commands; exec-status is stubbed."""
+    monkeypatch.setattr(VMConsoleManager, "COMMAND_COMPLETION_WAIT", 0)
+
+
+class _StubMethod:
+    """Stand-in for a proxmoxer HTTP verb such as ``get`` or ``post``.
+
+    Returns ``result`` on every call, or the next item of ``results`` when a
+    test needs successive calls to see different data. Raises ``error``
+    instead when one is set.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.reset()
+
+    def __call__(self, *args, **kwargs):
+        self.calls.append((args, kwargs))
+        if self.error is not None:
+            raise self.error
+        if self.results is not None:
+            return next(self.results)
+        return self.result
+
+    def reset(self):
+        self.calls.clear()
+        self.result = None
+        self.results = None
+        self.error = None
+
+
+class _StubEndpoint:
+    """Stand-in for a proxmoxer resource path.
+
+    Attribute access creates (and caches) child endpoints; calling an endpoint,
+    as in ``nodes("node1")``, records the arguments and returns the endpoint
+    itself, so every node/VM shares one branch of the tree.
+    """
+
+    def __init__(self):
+        self._children = {}
+        self.calls = []
+        self.get = _StubMethod()
+        self.post = _StubMethod()
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return self._children.setdefault(name, _StubEndpoint())
+
+    def __call__(self, *args):
+        self.calls.append(args)
+        return self
+
+    def feed(self, path, values):
+        """Have the method at dotted ``path`` return ``values`` in turn.
+
+        ``api.feed("nodes.status.get", [a, b])`` is shorthand for setting
+        ``api.nodes.status.get.results = iter([a, b])``.
+        """
+        target = self
+        for name in path.split("."):
+            target = getattr(target, name)
+        target.results = iter(values)
+
+    def reset(self):
+        """Clear recorded calls and configured results throughout the tree."""
+        self.calls.clear()
+        self.get.reset()
+        self.post.reset()
+        for child in self._children.values():
+            child.reset()
+
+
+class _StubProxmoxAPI:
+    """Replacement for the ProxmoxAPI class that hands out one stub tree."""
+
+    def __init__(self):
+        self.api = _StubEndpoint()
+        self.instantiation_count = 0
+
+    def __call__(self, **config):
+        self.instantiation_count += 1
+        return self.api
+
+
+@pytest.fixture(scope="module")
+def proxmox_api_class():
+    """Patch ProxmoxAPI for one module; tests reset the stub tree in between.
+
+    Module scope keeps the patch from leaking into modules collected later.
+    """
+    with patch("proxmox_mcp.core.proxmox.ProxmoxAPI", new=_StubProxmoxAPI()) as stub:
+        yield stub
+
+
+@pytest.fixture
+def proxmox_stub(proxmox_api_class):
+    """The shared ProxmoxAPI stub tree, cleared for each test."""
+    # Reset in place: a server built earlier holds a reference to the tree
+    api = proxmox_api_class.api
+    api.reset()
+    return api
@@ -9,9 +9,7 @@ This module tests the enhanced decryption error handling functionality including
 """
 
 import json
-import os
-import tempfile
-from unittest.mock import MagicMock, patch
+from unittest.mock import NonCallableMock, patch
 
 import pytest
 
@@ -20,6 +18,7 @@ from proxmox_mcp.config.loader import (
     _handle_decryption_error,
     load_config,
 )
+from proxmox_mcp.utils.encryption import TokenEncryption
 
 
 class TestEnhancedDecryptionErrors:
@@ -113,7 +112,7 @@ class TestEnhancedDecryptionErrors:
     def test_decrypt_config_tokens_field_context_in_error(self, mock_encryption_class):
         """Test that field context is preserved when decryption fails."""
         # Setup mock to raise an exception
-        mock_encryptor = MagicMock()
+        mock_encryptor = NonCallableMock(spec_set=TokenEncryption)
         mock_encryptor.decrypt_token.side_effect = Exception("Decryption failed")
         mock_encryption_class.return_value = mock_encryptor
 
@@ -177,11 +176,11 @@ class TestConfigLoaderIntegration:
 
     @patch("proxmox_mcp.config.loader.TokenEncryption")
     def test_load_config_with_decryption_error_provides_context(
-        self, mock_encryption_class
+        self, mock_encryption_class, tmp_path
     ):
         """Test that load_config provides enhanced error context when decryption fails."""
         # Setup mock to raise an exception during decryption
-        mock_encryptor = MagicMock()
+        mock_encryptor = NonCallableMock(spec_set=TokenEncryption)
         mock_encryptor.decrypt_token.side_effect = Exception("Mock decryption failure")
         mock_encryption_class.return_value = mock_encryptor
 
@@ -196,24 +195,21 @@ class TestConfigLoaderIntegration:
             "logging": {"level": "INFO"},
         }
 
-        with tempfile.NamedTemporaryFile(mode="w", suffix=".json", delete=False) as f:
-            json.dump(config_data, f)
-            temp_path = f.name
+        config_path = tmp_path / "config.json"
+        config_path.write_bytes(json.dumps(config_data, separators=(",", ":")).encode())
 
-        try:
-            with pytest.raises(ValueError) as exc_info:
-                load_config(temp_path)
-
-            error_msg = str(exc_info.value)
-            # Should get enhanced error from our error handler
-            assert "auth.token_value" in error_msg
-            assert "Decryption key mismatch" in error_msg
+        with pytest.raises(ValueError) as exc_info:
+            load_config(str(config_path))
 
-        finally:
-            os.unlink(temp_path)
+        error_msg = str(exc_info.value)
+        # Should get enhanced error from our error handler
+        assert "auth.token_value" in error_msg
+        assert "Decryption key mismatch" in error_msg
 
     @patch("proxmox_mcp.config.loader.TokenEncryption")
-    def test_load_config_with_encryption_library_error(self, mock_encryption_class):
+    def test_load_config_with_encryption_library_error(
+        self, mock_encryption_class, tmp_path
+    ):
         """Test load_config handling when encryption library itself fails."""
         # Setup mock to raise an exception during initialization
         mock_encryption_class.side_effect = Exception("Encryption library error")
@@ -228,17 +224,12 @@ class TestConfigLoaderIntegration:
             "logging": {"level": "INFO"},
         }
 
-        with tempfile.NamedTemporaryFile(mode="w", suffix=".json", delete=False) as f:
-            json.dump(config_data, f)
-            temp_path = f.name
-
-        try:
-            with pytest.raises(ValueError) as exc_info:
-                load_config(temp_path)
+        config_path = tmp_path / "config.json"
+        config_path.write_bytes(json.dumps(config_data, separators=(",", ":")).encode())
 
-            error_msg = str(exc_info.value)
-            # Should still get enhanced error context
-            assert "auth.token_value" in error_msg
+        with pytest.raises(ValueError) as exc_info:
+            load_config(str(config_path))
 
-        finally:
-            os.unlink(temp_path)
+        error_msg = str(exc_info.value)
+        # Should still get enhanced error context
+        assert "auth.token_value" in error_msg
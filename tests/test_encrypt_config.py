@@ -11,12 +11,16 @@ This module tests the encrypt_config command-line utility including:
 import json
 import os
 from pathlib import Path
-import tempfile
-from unittest.mock import MagicMock, patch
+import re
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Tuple, Union
+from unittest.mock import DEFAULT, MagicMock, Mock, call, patch
 
 import pytest
 
+from proxmox_mcp.config import loader
 from proxmox_mcp.utils.encrypt_config import (
+    _CLEAR_SEQUENCE,
     clear_terminal_if_requested,
     create_backup,
     generate_master_key,
@@ -26,6 +30,43 @@ from proxmox_mcp.utils.encrypt_config import (
 )
 from proxmox_mcp.utils.encryption import TokenEncryption
 
+# The print() call clear_terminal_if_requested() makes to wipe the screen
+_CLEAR_CALL = call(_CLEAR_SEQUENCE, end="", flush=True)
+
+
+def _dump(path: Union[str, Path], data: Dict[str, Any]) -> None:
+    """Write a config dict to disk as compact JSON in a single write."""
+    Path(path).write_bytes(json.dumps(data, separators=(",", ":")).encode())
+
+
+def _load(path: Union[str, Path]) -> Any:
+    """Read a JSON config from disk without a text-mode decode step."""
+    return json.loads(Path(path).read_bytes())
+
+
+def _field(path: Union[str, Path], name: str) -> str:
+    """Pull a single string field out of a flat-schema JSON config.
+
+    Only for assertions on known fixtures; use _load() when the test
+    exercises the document structure itself.
+    """
+    match = re.search(rb'"%s":\s*"([^"]*)"' % name.encode(), Path(path).read_bytes())
+    assert match, f"{name} not found in {path}"
+    return match.group(1).decode()
+
+
+class _Contains:
+    """Matcher that equals any value whose str() contains the given text."""
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+
+    def __eq__(self, other: object) -> bool:
+        return self.text in str(other)
+
+    def __repr__(self) -> str:
+        return f"<containing {self.text!r}>"
+
 
 class TestSecureKeyGeneration:
     """Test cases for secure master key generation."""
@@ -61,14 +102,14 @@ class TestSecureKeyGeneration:
         mock_chmod.assert_called_once_with(0o600)
 
         # Verify secure workflow messages were displayed
-        printed_calls = [str(call) for call in mock_print.call_args_list]
-        all_output = " ".join(printed_calls)
-
-        assert "Master key generated securely" in all_output
-        assert "Key saved to:" in all_output
-        assert "export PROXMOX_MCP_MASTER_KEY=$(cat ~/.proxmox_mcp_key)" in all_output
+        mock_print.assert_any_call(_Contains("Master key generated securely"))
+        mock_print.assert_any_call(_Contains("Key saved to:"))
+        mock_print.assert_any_call(
+            _Contains("export PROXMOX_MCP_MASTER_KEY=$(cat ~/.proxmox_mcp_key)")
+        )
 
         # Verify NO raw key is displayed in output
+        printed_calls = [str(call) for call in mock_print.call_args_list]
         key_displays = [
             call
             for call in printed_calls
@@ -103,11 +144,7 @@ class TestSecureKeyGeneration:
         assert exc_info.value.code == 1
 
         # Verify error message was displayed
-        printed_calls = [str(call) for call in mock_print.call_args_list]
-        error_messages = [
-            call for call in printed_calls if "Error saving key file" in call
-        ]
-        assert len(error_messages) > 0
+        mock_print.assert_any_call(_Contains("Error saving key file"))
 
     @patch("pathlib.Path.write_text")
     @patch("pathlib.Path.chmod")
@@ -162,264 +199,263 @@ class TestSecureKeyGeneration:
 
         generate_master_key()
 
-        printed_calls = [str(call) for call in mock_print.call_args_list]
-        all_output = " ".join(printed_calls)
-
         # Check for key security reminders
-        assert "Store this file securely" in all_output
-        assert "Key file permissions set to 600" in all_output
-        assert "Losing this key means losing access" in all_output
+        mock_print.assert_any_call(_Contains("Store this file securely"))
+        mock_print.assert_any_call(_Contains("Key file permissions set to 600"))
+        mock_print.assert_any_call(_Contains("Losing this key means losing access"))
 
 
 class TestKeyRotation:
     """Test cases for master key rotation functionality."""
 
-    def test_create_backup(self) -> None:
-        """Test that backup creation works correctly."""
-        with tempfile.NamedTemporaryFile(mode="w", delete=False, suffix=".json") as f:
-            test_config = {"test": "data"}
-            json.dump(test_config, f)
-            f.flush()
+    @pytest.fixture
+    def old_key(self, encrypted_fixture: Tuple[str, str]) -> str:
+        """Master key that rotation tests start from."""
+        return encrypted_fixture[0]
 
-            try:
-                backup_path = create_backup(f.name)
+    @pytest.fixture
+    def master_key_env(self, monkeypatch: pytest.MonkeyPatch, old_key: str) -> str:
+        """Expose the old master key through PROXMOX_MCP_MASTER_KEY."""
+        monkeypatch.setenv("PROXMOX_MCP_MASTER_KEY", old_key)
+        return old_key
 
-                # Verify backup exists
-                assert os.path.exists(backup_path)
+    def test_create_backup(self, tmp_path: Path) -> None:
+        """Test that backup creation works correctly."""
+        test_config = {"test": "data"}
+        config_path = tmp_path / "config.json"
+        _dump(config_path, test_config)
+
+        backup_path = create_backup(str(config_path))
 
-                # Verify backup contains same data
-                with open(backup_path) as backup_f:
-                    backup_data = json.load(backup_f)
-                assert backup_data == test_config
+        # Verify backup exists
+        assert os.path.exists(backup_path)
 
-                # Verify backup path format
-                assert backup_path.startswith(f.name + ".backup.")
+        # Verify backup contains same data
+        assert _load(backup_path) == test_config
 
-                # Clean up
-                os.unlink(backup_path)
-            finally:
-                os.unlink(f.name)
+        # Verify backup path format
+        assert backup_path.startswith(str(config_path) + ".backup.")
 
-    def test_verify_config_decryption_with_encrypted_token(self) -> None:
+    def test_verify_config_decryption_with_encrypted_token(
+        self, encrypted_fixture: Tuple[str, str], key_pool: List[str], tmp_path: Path
+    ) -> None:
         """Test config decryption verification with encrypted token."""
         # Create test config with encrypted token
-        master_key = TokenEncryption.generate_master_key()
-        encryptor = TokenEncryption(master_key=master_key)
-        encrypted_token = encryptor.encrypt_token("test-token")  # nosec: test credential
-
+        master_key, encrypted_token = encrypted_fixture
         test_config = {"auth": {"token_value": encrypted_token}}
+        config_path = tmp_path / "config.json"
+        _dump(config_path, test_config)
 
-        with tempfile.NamedTemporaryFile(mode="w", delete=False, suffix=".json") as f:
-            json.dump(test_config, f)
-            f.flush()
-
-            try:
-                # Should verify successfully with correct key
-                assert verify_config_decryption(f.name, master_key)
+        # Should verify successfully with correct key
+        assert verify_config_decryption(str(config_path), master_key)
 
-                # Should fail with wrong key
-                wrong_key = TokenEncryption.generate_master_key()
-                assert not verify_config_decryption(f.name, wrong_key)
-            finally:
-                os.unlink(f.name)
+        # Should fail with wrong key
+        wrong_key = key_pool[1]
+        assert not verify_config_decryption(str(config_path), wrong_key)
 
-    def test_verify_config_decryption_with_plain_token(self) -> None:
+    def test_verify_config_decryption_with_plain_token(
+        self, key_pool: List[str], tmp_path: Path
+    ) -> None:
         """Test config decryption verification with plain text token."""
         test_config = {"auth": {"token_value": "plain-text-token"}}  # nosec: test credential
+        config_path = tmp_path / "config.json"
+        _dump(config_path, test_config)
 
-        with tempfile.NamedTemporaryFile(mode="w", delete=False, suffix=".json") as f:
-            json.dump(test_config, f)
-            f.flush()
-
-            try:
-                # Should pass verification even with random key since token is plain text
-                random_key = TokenEncryption.generate_master_key()
-                assert verify_config_decryption(f.name, random_key)
-            finally:
-                os.unlink(f.name)
+        # Should pass verification even with random key since token is plain text
+        random_key = key_pool[0]
+        assert verify_config_decryption(str(config_path), random_key)
 
-    def test_verify_config_decryption_no_token(self) -> None:
+    def test_verify_config_decryption_no_token(
+        self, key_pool: List[str], tmp_path: Path
+    ) -> None:
         """Test config decryption verification with no token."""
         test_config = {"other": "data"}
+        config_path = tmp_path / "config.json"
+        _dump(config_path, test_config)
 
-        with tempfile.NamedTemporaryFile(mode="w", delete=False, suffix=".json") as f:
-            json.dump(test_config, f)
-            f.flush()
-
-            try:
-                # Should pass verification when no encrypted tokens exist
-                random_key = TokenEncryption.generate_master_key()
-                assert verify_config_decryption(f.name, random_key)
-            finally:
-                os.unlink(f.name)
+        # Should pass verification when no encrypted tokens exist
+        random_key = key_pool[0]
+        assert verify_config_decryption(str(config_path), random_key)
 
-    @patch.dict(os.environ, {}, clear=True)
-    def test_rotate_master_key_no_env_key(self) -> None:
+    def test_rotate_master_key_no_env_key(
+        self, monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+    ) -> None:
         """Test key rotation fails when no environment key is set."""
+        monkeypatch.delenv("PROXMOX_MCP_MASTER_KEY", raising=False)
         test_config = {"auth": {"token_value": "enc:test"}}
+        config_path = tmp_path / "config.json"
+        _dump(config_path, test_config)
 
-        with tempfile.NamedTemporaryFile(mode="w", delete=False, suffix=".json") as f:
-            json.dump(test_config, f)
-            f.flush()
-
-            try:
-                with pytest.raises(SystemExit):
-                    rotate_master_key(f.name)
-            finally:
-                os.unlink(f.name)
+        with pytest.raises(SystemExit):
+            rotate_master_key(str(config_path))
 
-    @patch.dict(os.environ, {"PROXMOX_MCP_MASTER_KEY": "invalid_key"})
-    def test_rotate_master_key_invalid_env_key(self) -> None:
+    def test_rotate_master_key_invalid_env_key(
+        self,
+        monkeypatch: pytest.MonkeyPatch,
+        encrypted_fixture: Tuple[str, str],
+        tmp_path: Path,
+    ) -> None:
         """Test key rotation fails when environment key can't decrypt config."""
+        monkeypatch.setenv("PROXMOX_MCP_MASTER_KEY", "invalid_key")
         # Create config with token encrypted with different key
-        actual_key = TokenEncryption.generate_master_key()
-        encryptor = TokenEncryption(master_key=actual_key)
-        encrypted_token = encryptor.encrypt_token("test-token")  # nosec: test credential
-
+        _, encrypted_token = encrypted_fixture
         test_config = {"auth": {"token_value": encrypted_token}}
+        config_path = tmp_path / "config.json"
+        _dump(config_path, test_config)
 
-        with tempfile.NamedTemporaryFile(mode="w", delete=False, suffix=".json") as f:
-            json.dump(test_config, f)
-            f.flush()
-
-            try:
-                with pytest.raises(SystemExit):
-                    rotate_master_key(f.name)
-            finally:
-                os.unlink(f.name)
+        with pytest.raises(SystemExit):
+            rotate_master_key(str(config_path))
 
-    def test_rotate_master_key_successful(self) -> None:
+    def test_rotate_master_key_successful(
+        self,
+        master_key_env: str,
+        encrypted_fixture: Tuple[str, str],
+        key_pool: List[str],
+        tmp_path: Path,
+    ) -> None:
         """Test successful key rotation."""
-        # Create original key and encrypted config
-        old_key = TokenEncryption.generate_master_key()
-        old_encryptor = TokenEncryption(master_key=old_key)
-        encrypted_token = old_encryptor.encrypt_token("test-token-value")  # nosec: test credential
-
+        # Create encrypted config with the old key set in the environment
+        _, encrypted_token = encrypted_fixture
         test_config = {"auth": {"token_value": encrypted_token}, "other": "data"}
+        config_path = tmp_path / "config.json"
+        _dump(config_path, test_config)
 
-        with tempfile.NamedTemporaryFile(mode="w", delete=False, suffix=".json") as f:
-            json.dump(test_config, f)
-            f.flush()
+        # Use a different key for rotation
+        new_key = key_pool[1]
 
-            try:
-                # Set old key in environment
-                with patch.dict(os.environ, {"PROXMOX_MCP_MASTER_KEY": old_key}):
-                    # Generate new key for rotation
-                    new_key = TokenEncryption.generate_master_key()
+        # Perform rotation
+        rotate_master_key(str(config_path), new_key)
 
-                    # Perform rotation
-                    rotate_master_key(f.name, new_key)
+        # Verify config was updated
+        rotated_config = _load(config_path)
 
-                    # Verify config was updated
-                    with open(f.name) as config_f:
-                        rotated_config = json.load(config_f)
+        # Should have different encrypted token
+        new_encrypted_token = rotated_config["auth"]["token_value"]
+        assert new_encrypted_token != encrypted_token
+        assert new_encrypted_token.startswith("enc:")
 
-                    # Should have different encrypted token
-                    new_encrypted_token = rotated_config["auth"]["token_value"]
-                    assert new_encrypted_token != encrypted_token
-                    assert new_encrypted_token.startswith("enc:")
+        # Should decrypt to same value with new key
+        new_encryptor = TokenEncryption(master_key=new_key)
+        decrypted_token = new_encryptor.decrypt_token(new_encrypted_token)
+        assert decrypted_token == "test-token"
 
-                    # Should decrypt to same value with new key
-                    new_encryptor = TokenEncryption(master_key=new_key)
-                    decrypted_token = new_encryptor.decrypt_token(new_encrypted_token)
-                    assert decrypted_token == "test-token-value"
+        # Other data should be unchanged
+        assert rotated_config["other"] == "data"
 
-                    # Other data should be unchanged
-                    assert rotated_config["other"] == "data"
-
-                    # Backup should exist
-                    backup_files = [
-                        file
-                        for file in os.listdir(os.path.dirname(f.name))
-                        if file.startswith(os.path.basename(f.name) + ".backup.")
-                    ]
-                    assert len(backup_files) == 1
+        # Backup should exist
+        backup_files = [
+            entry.name
+            for entry in os.scandir(tmp_path)
+            if entry.name.startswith(config_path.name + ".backup.")
+        ]
+        assert len(backup_files) == 1
 
-                    # Clean up backup
-                    backup_path = os.path.join(os.path.dirname(f.name), backup_files[0])
-                    os.unlink(backup_path)
+    def test_rotate_master_key_covers_every_encrypted_path(
+        self,
+        monkeypatch: pytest.MonkeyPatch,
+        master_key_env: str,
+        encrypted_fixture: Tuple[str, str],
+        key_pool: List[str],
+        tmp_path: Path,
+    ) -> None:
+        """Test that rotation re-encrypts every field in the loader's path table."""
+        monkeypatch.setattr(
+            loader,
+            "_ENCRYPTED_PATHS",
+            (("auth", "token_value"), ("database", "password")),
+        )
+        _, encrypted_token = encrypted_fixture
+        test_config = {
+            "auth": {"token_value": encrypted_token},
+            "database": {"password": encrypted_token},
+        }
+        config_path = tmp_path / "config.json"
+        _dump(config_path, test_config)
+
+        # Verification must decrypt every listed field, not just the token
+        assert verify_config_decryption(str(config_path), master_key_env)
+
+        new_key = key_pool[1]
+        rotate_master_key(str(config_path), new_key)
+
+        rotated_config = _load(config_path)
+        new_encryptor = TokenEncryption(master_key=new_key)
+        for section, field in (("auth", "token_value"), ("database", "password")):
+            assert new_encryptor.decrypt_token(rotated_config[section][field]) == (
+                "test-token"
+            )
+
+    def test_rotate_master_key_all_successful(
+        self, master_key_env: str, key_pool: List[str], tmp_path: Path
+    ) -> None:
+        """Test successful bulk key rotation."""
+        old_encryptor = TokenEncryption(master_key=master_key_env)
+        token1, token2 = [
+            old_encryptor.encrypt_token(token) for token in ("token1", "token2")
+        ]
 
-            finally:
-                os.unlink(f.name)
+        # Create multiple config files
+        config1_path = tmp_path / "config1.json"
+        config2_path = tmp_path / "config2.json"
+        config3_path = tmp_path / "config_plain.json"
+
+        # Config 1: encrypted token
+        config1 = {
+            "auth": {"token_value": token1},
+            "name": "config1",
+        }
+
+        # Config 2: encrypted token
+        config2 = {
+            "auth": {"token_value": token2},
+            "name": "config2",
+        }
+
+        # Config 3: plain token (should be skipped)
+        config3 = {"auth": {"token_value": "plain-token"}, "name": "config3"}  # nosec: test credential
+
+        # Write configs
+        for path, config in (
+            (config1_path, config1),
+            (config2_path, config2),
+            (config3_path, config3),
+        ):
+            _dump(path, config)
+
+        # Perform bulk rotation with the old key set in the environment
+        new_key = key_pool[1]
+        rotate_master_key_all(str(tmp_path), new_key)
+
+        # Verify encrypted configs were rotated
+        new_encryptor = TokenEncryption(master_key=new_key)
+
+        # Check config1
+        decrypted_token1 = new_encryptor.decrypt_token(
+            _field(config1_path, "token_value")
+        )
+        assert decrypted_token1 == "token1"
+        assert _field(config1_path, "name") == "config1"
+
+        # Check config2
+        decrypted_token2 = new_encryptor.decrypt_token(
+            _field(config2_path, "token_value")
+        )
+        assert decrypted_token2 == "token2"
+        assert _field(config2_path, "name") == "config2"
+
+        # Check config3 (should be unchanged)
+        assert _load(config3_path) == config3
+
+        # Verify backups were created for rotated configs
+        backup_files = [
+            entry.name for entry in os.scandir(tmp_path) if ".backup." in entry.name
+        ]
+        assert len(backup_files) == 2  # Only encrypted configs should have backups
 
-    def test_rotate_master_key_all_successful(self) -> None:
-        """Test successful bulk key rotation."""
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Create test keys
-            old_key = TokenEncryption.generate_master_key()
-            old_encryptor = TokenEncryption(master_key=old_key)
-
-            # Create multiple config files
-            config1_path = os.path.join(temp_dir, "config1.json")
-            config2_path = os.path.join(temp_dir, "config2.json")
-            config3_path = os.path.join(temp_dir, "config_plain.json")
-
-            # Config 1: encrypted token
-            config1 = {
-                "auth": {"token_value": old_encryptor.encrypt_token("token1")},
-                "name": "config1",
-            }
-
-            # Config 2: encrypted token
-            config2 = {
-                "auth": {"token_value": old_encryptor.encrypt_token("token2")},
-                "name": "config2",
-            }
-
-            # Config 3: plain token (should be skipped)
-            config3 = {"auth": {"token_value": "plain-token"}, "name": "config3"}  # nosec: test credential
-
-            # Write configs
-            with open(config1_path, "w") as f:
-                json.dump(config1, f)
-            with open(config2_path, "w") as f:
-                json.dump(config2, f)
-            with open(config3_path, "w") as f:
-                json.dump(config3, f)
-
-            # Set old key in environment and perform bulk rotation
-            with patch.dict(os.environ, {"PROXMOX_MCP_MASTER_KEY": old_key}):
-                new_key = TokenEncryption.generate_master_key()
-                rotate_master_key_all(temp_dir, new_key)
-
-                # Verify encrypted configs were rotated
-                new_encryptor = TokenEncryption(master_key=new_key)
-
-                # Check config1
-                with open(config1_path) as f:
-                    rotated_config1 = json.load(f)
-                decrypted_token1 = new_encryptor.decrypt_token(
-                    rotated_config1["auth"]["token_value"]
-                )
-                assert decrypted_token1 == "token1"
-                assert rotated_config1["name"] == "config1"
-
-                # Check config2
-                with open(config2_path) as f:
-                    rotated_config2 = json.load(f)
-                decrypted_token2 = new_encryptor.decrypt_token(
-                    rotated_config2["auth"]["token_value"]
-                )
-                assert decrypted_token2 == "token2"
-                assert rotated_config2["name"] == "config2"
-
-                # Check config3 (should be unchanged)
-                with open(config3_path) as f:
-                    unchanged_config3 = json.load(f)
-                assert unchanged_config3["auth"]["token_value"] == "plain-token"
-                assert unchanged_config3["name"] == "config3"
-
-                # Verify backups were created for rotated configs
-                backup_files = [f for f in os.listdir(temp_dir) if ".backup." in f]
-                assert (
-                    len(backup_files) == 2
-                )  # Only encrypted configs should have backups
-
-    def test_rotate_master_key_all_no_configs(self) -> None:
+    def test_rotate_master_key_all_no_configs(self, tmp_path: Path) -> None:
         """Test bulk rotation with no configuration files."""
-        with tempfile.TemporaryDirectory() as temp_dir:
-            with pytest.raises(SystemExit):
-                rotate_master_key_all(temp_dir)
+        with pytest.raises(SystemExit):
+            rotate_master_key_all(str(tmp_path))
 
     def test_rotate_master_key_all_invalid_directory(self) -> None:
         """Test bulk rotation with invalid directory."""
@@ -430,183 +466,136 @@ class TestKeyRotation:
 class TestTerminalClearing:
     """Test cases for terminal clearing functionality."""
 
-    @patch("platform.system")
-    @patch("builtins.input")
-    @patch("builtins.print")
+    @pytest.fixture
+    def tc_mocks(self) -> Iterator[SimpleNamespace]:
+        """Patch input, print and platform detection in one place."""
+        with (
+            patch.multiple(
+                "builtins", input=DEFAULT, print=DEFAULT, new_callable=Mock
+            ) as builtins_mocks,
+            patch("platform.system", new_callable=Mock) as system,
+        ):
+            yield SimpleNamespace(
+                input=builtins_mocks["input"],
+                print=builtins_mocks["print"],
+                system=system,
+            )
+
     def test_clear_terminal_if_requested_yes_linux(
-        self,
-        mock_print: MagicMock,
-        mock_input: MagicMock,
-        mock_system: MagicMock,
+        self, tc_mocks: SimpleNamespace
     ) -> None:
         """Test terminal clearing when user agrees on Linux/macOS."""
         # Mock user saying yes and platform being Linux
-        mock_input.return_value = "y"
-        mock_system.return_value = "Linux"
+        tc_mocks.input.return_value = "y"
+        tc_mocks.system.return_value = "Linux"
 
         clear_terminal_if_requested()
 
         # Verify ANSI escape sequence was printed (our secure implementation)
-        printed_calls = [str(call) for call in mock_print.call_args_list]
-        # Check for the ANSI escape sequence - look for hex representation (\x1b)
-        ansi_calls = [call for call in printed_calls if "\\x1b[2J\\x1b[H" in call]
-        assert len(ansi_calls) > 0, "ANSI escape sequence should be printed"
+        assert (
+            _CLEAR_CALL in tc_mocks.print.call_args_list
+        ), "ANSI escape sequence should be printed"
 
         # Verify success message was printed
-        success_messages = [
-            call for call in printed_calls if "Terminal cleared for security" in call
-        ]
-        assert len(success_messages) > 0
+        tc_mocks.print.assert_any_call(_Contains("Terminal cleared for security"))
 
-    @patch("platform.system")
-    @patch("builtins.input")
-    @patch("builtins.print")
     def test_clear_terminal_if_requested_yes_windows(
-        self,
-        mock_print: MagicMock,
-        mock_input: MagicMock,
-        mock_system: MagicMock,
+        self, tc_mocks: SimpleNamespace
     ) -> None:
         """Test terminal clearing when user agrees on Windows."""
         # Mock user saying yes and platform being Windows
-        mock_input.return_value = "yes"
-        mock_system.return_value = "Windows"
+        tc_mocks.input.return_value = "yes"
+        tc_mocks.system.return_value = "Windows"
 
         clear_terminal_if_requested()
 
         # Verify ANSI escape sequence was printed (works on modern Windows)
-        printed_calls = [str(call) for call in mock_print.call_args_list]
         # Should either have ANSI escape or fallback newlines
-        ansi_calls = [call for call in printed_calls if "\\033[2J\\033[H" in call]
-        newline_calls = [call for call in printed_calls if "\\n" * 10 in call]
+        printed = tc_mocks.print.call_args_list
         assert (
-            len(ansi_calls) > 0 or len(newline_calls) > 0
+            _CLEAR_CALL in printed or call("\n" * 50) in printed
         ), "Terminal should be cleared"
 
         # Verify success message was printed
-        success_messages = [
-            call for call in printed_calls if "Terminal cleared for security" in call
-        ]
-        assert len(success_messages) > 0
+        tc_mocks.print.assert_any_call(_Contains("Terminal cleared for security"))
 
-    @patch("platform.system")
-    @patch("builtins.input")
-    @patch("builtins.print")
-    def test_clear_terminal_if_requested_no(
-        self,
-        mock_print: MagicMock,
-        mock_input: MagicMock,
-        mock_system: MagicMock,
-    ) -> None:
+    def test_clear_terminal_if_requested_no(self, tc_mocks: SimpleNamespace) -> None:
         """Test when user declines terminal clearing."""
         # Mock user saying no
-        mock_input.return_value = "n"
-        mock_system.return_value = "Linux"
+        tc_mocks.input.return_value = "n"
+        tc_mocks.system.return_value = "Linux"
 
         clear_terminal_if_requested()
 
         # Verify manual instruction was printed
-        printed_calls = [str(call) for call in mock_print.call_args_list]
-        manual_instructions = [
-            call for call in printed_calls if "clear terminal manually" in call
-        ]
-        assert len(manual_instructions) > 0
+        tc_mocks.print.assert_any_call(_Contains("clear terminal manually"))
 
         # Verify no ANSI escape sequence was printed
-        ansi_calls = [call for call in printed_calls if "\\033[2J\\033[H" in call]
-        assert len(ansi_calls) == 0, "No terminal clearing should occur"
+        assert (
+            _CLEAR_CALL not in tc_mocks.print.call_args_list
+        ), "No terminal clearing should occur"
 
-    @patch("platform.system")
-    @patch("builtins.input")
-    @patch("builtins.print")
     def test_clear_terminal_if_requested_keyboard_interrupt(
-        self,
-        mock_print: MagicMock,
-        mock_input: MagicMock,
-        mock_system: MagicMock,
+        self, tc_mocks: SimpleNamespace
     ) -> None:
         """Test handling of keyboard interrupt during terminal clearing."""
         # Mock user pressing Ctrl+C
-        mock_input.side_effect = KeyboardInterrupt()
-        mock_system.return_value = "Linux"
+        tc_mocks.input.side_effect = KeyboardInterrupt()
+        tc_mocks.system.return_value = "Linux"
 
         # Should not raise exception
         clear_terminal_if_requested()
 
         # Verify manual instruction was printed - look for the specific message from
         # KeyboardInterrupt handler
-        printed_calls = [str(call) for call in mock_print.call_args_list]
-        interrupt_instructions = [
-            call
-            for call in printed_calls
-            if "Consider clearing terminal manually for security" in call
-        ]
-        assert len(interrupt_instructions) > 0
+        tc_mocks.print.assert_any_call(
+            _Contains("Consider clearing terminal manually for security")
+        )
 
-    @patch("platform.system")
-    @patch("builtins.input")
-    @patch("builtins.print")
     def test_clear_terminal_if_requested_eof_error(
-        self,
-        mock_print: MagicMock,
-        mock_input: MagicMock,
-        mock_system: MagicMock,
+        self, tc_mocks: SimpleNamespace
     ) -> None:
         """Test handling of EOF error during terminal clearing."""
         # Mock EOF error
-        mock_input.side_effect = EOFError()
-        mock_system.return_value = "Linux"
+        tc_mocks.input.side_effect = EOFError()
+        tc_mocks.system.return_value = "Linux"
 
         # Should not raise exception
         clear_terminal_if_requested()
 
         # Verify manual instruction was printed - look for the specific message from
         # EOFError handler
-        printed_calls = [str(call) for call in mock_print.call_args_list]
-        eof_instructions = [
-            call
-            for call in printed_calls
-            if "Consider clearing terminal manually for security" in call
-        ]
-        assert len(eof_instructions) > 0
+        tc_mocks.print.assert_any_call(
+            _Contains("Consider clearing terminal manually for security")
+        )
 
-    @patch("platform.system")
-    @patch("builtins.input")
-    @patch("builtins.print")
     def test_clear_terminal_if_requested_general_error(
-        self,
-        mock_print: MagicMock,
-        mock_input: MagicMock,
-        mock_system: MagicMock,
+        self, tc_mocks: SimpleNamespace
     ) -> None:
         """Test handling of general error during terminal clearing."""
         # Mock user saying yes but print failing
-        mock_input.return_value = "y"
-        mock_system.return_value = "Linux"
+        tc_mocks.input.return_value = "y"
+        tc_mocks.system.return_value = "Linux"
         # Make print fail on ANSI sequence
-        mock_print.side_effect = [None, Exception("Print failed"), None, None]
+        tc_mocks.print.side_effect = [None, Exception("Print failed"), None, None]
 
         # Should not raise exception
         clear_terminal_if_requested()
 
         # Verify error message was printed
-        printed_calls = [str(call) for call in mock_print.call_args_list]
-        error_messages = [
-            call for call in printed_calls if "Could not clear terminal" in call
-        ]
-        assert len(error_messages) > 0
+        tc_mocks.print.assert_any_call(_Contains("Could not clear terminal"))
 
         # Verify manual instruction was printed
-        manual_instructions = [
-            call for call in printed_calls if "clear terminal manually" in call
-        ]
-        assert len(manual_instructions) > 0
-
-    @patch("proxmox_mcp.utils.encrypt_config.clear_terminal_if_requested")
-    @patch("builtins.input")
-    @patch("builtins.print")
+        tc_mocks.print.assert_any_call(_Contains("clear terminal manually"))
+
+    @patch(
+        "proxmox_mcp.utils.encrypt_config.clear_terminal_if_requested",
+        new_callable=Mock,
+    )
+    @patch("builtins.input", new_callable=Mock)
+    @patch("builtins.print", new_callable=Mock)
     def test_generate_master_key_calls_terminal_clearing(
-        self, mock_print: MagicMock, mock_input: MagicMock, mock_clear: MagicMock
+        self, mock_print: Mock, mock_input: Mock, mock_clear: Mock
     ) -> None:
         """Test that master key generation calls terminal clearing."""
         generate_master_key()
@@ -614,62 +603,28 @@ class TestTerminalClearing:
         # Verify terminal clearing was called
         mock_clear.assert_called_once()
 
-    @patch("platform.system")
-    @patch("builtins.input")
-    @patch("builtins.print")
+    @pytest.mark.parametrize("response", ["Y", "YES", "Yes", "y", "yes"])
     def test_clear_terminal_case_insensitive_responses(
-        self, mock_print: MagicMock, mock_input: MagicMock, mock_system: MagicMock
+        self, tc_mocks: SimpleNamespace, response: str
     ) -> None:
         """Test that terminal clearing accepts case-insensitive responses."""
-        mock_system.return_value = "Linux"
-
-        # Test various positive responses
-        positive_responses = ["Y", "YES", "Yes", "y", "yes"]
-
-        for response in positive_responses:
-            mock_input.return_value = response
-
-            clear_terminal_if_requested()
+        tc_mocks.system.return_value = "Linux"
+        tc_mocks.input.return_value = response
 
-            # Our implementation no longer uses subprocess - verify ANSI escape was printed
-            # Check that terminal clearing message was printed
-            printed_calls = [str(call) for call in mock_print.call_args_list]
-            success_messages = [
-                call
-                for call in printed_calls
-                if "Terminal cleared for security" in call
-            ]
-            assert len(success_messages) > 0
+        clear_terminal_if_requested()
 
-            # Reset for next iteration
-            mock_print.reset_mock()
+        # Check that terminal clearing message was printed
+        tc_mocks.print.assert_any_call(_Contains("Terminal cleared for security"))
 
-    @patch("platform.system")
-    @patch("builtins.input")
-    @patch("builtins.print")
+    @pytest.mark.parametrize("response", ["  y  ", "\ty\t", "\n yes \n"])
     def test_clear_terminal_whitespace_handling(
-        self, mock_print: MagicMock, mock_input: MagicMock, mock_system: MagicMock
+        self, tc_mocks: SimpleNamespace, response: str
     ) -> None:
         """Test that terminal clearing handles whitespace in responses."""
-        mock_system.return_value = "Linux"
-
-        # Test responses with whitespace
-        responses_with_whitespace = ["  y  ", "\ty\t", "\n yes \n"]
+        tc_mocks.system.return_value = "Linux"
+        tc_mocks.input.return_value = response
 
-        for response in responses_with_whitespace:
-            mock_input.return_value = response
-
-            clear_terminal_if_requested()
-
-            # Our implementation no longer uses subprocess - verify ANSI escape was printed
-            # Check that terminal clearing message was printed
-            printed_calls = [str(call) for call in mock_print.call_args_list]
-            success_messages = [
-                call
-                for call in printed_calls
-                if "Terminal cleared for security" in call
-            ]
-            assert len(success_messages) > 0
+        clear_terminal_if_requested()
 
-            # Reset for next iteration
-            mock_print.reset_mock()
+        # Check that terminal clearing message was printed
+        tc_mocks.print.assert_any_call(_Contains("Terminal cleared for security"))
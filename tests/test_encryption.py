@@ -11,16 +11,57 @@ This module tests the TokenEncryption class functionality including:
 
 import base64
 import os
-from unittest.mock import patch
+import re
 
 import pytest
 
+from proxmox_mcp.utils import encryption
 from proxmox_mcp.utils.encryption import (
     TokenEncryption,
     decrypt_sensitive_value,
     encrypt_sensitive_value,
 )
 
+# URL-safe base64 alphabet with optional trailing padding
+_B64URL_RE = re.compile(r"^[A-Za-z0-9_\-]+=*$")
+
+# Encrypted token envelopes: versioned 'enc:v2:{salt}:{data}' and the
+# unversioned salted 'enc:{salt}:{data}'
+_NEW_FORMAT_RE = re.compile(r"^enc:v2:[A-Za-z0-9_\-=]+:[A-Za-z0-9_\-=]+$")
+_SALTED_FORMAT_RE = re.compile(r"^enc:[A-Za-z0-9_\-=]+:[A-Za-z0-9_\-=]+$")
+
+# Known-answer vectors made outside this package with hashlib.pbkdf2_hmac
+# (SHA-256, 100,000 rounds) and Fernet: the key is bytes 0..31, the salted
+# token uses salt bytes 100..115 and the legacy token the static salt.
+_KAT_MASTER_KEY = "AAECAwQFBgcICQoLDA0ODxAREhMUFRYXGBkaGxwdHh8="
+_KAT_PLAINTEXT = "known-answer-token"  # nosec: test credential
+_KAT_SALTED_TOKEN = (
+    "enc:ZGVmZ2hpamtsbW5vcHFycw==:Z0FBQUFBQnEwV0pReXZPUXdrSERJamk5SFk0aHQ2VW9s"
+    "ZW1jMFJjcVpnWFRSazZCVUpNOTFScmZZUmJwZ1hqd1k2endHQW9BRERYUEJtenUyRTdKQjJE"
+    "bTJCXzB0MWE4dkNzLU5vUEtBRVlhT19JR0lkUjI3Nzg9"
+)
+_KAT_LEGACY_TOKEN = (
+    "enc:Z0FBQUFBQnEwV0pRMkV1QzFhV2pNSVhzVVdDem9SQmJwUFYxdHo1Q2sxVVRQemptUzcw"
+    "bHZ3ZXZONFlLZk5wYUExNTJmUHJTcTZhUmlSaUtsTGdtYXByMlF2dHF2dW9JQi1sZ19TWnlI"
+    "dWhLMVl6U1EzX3ZnUDA9"
+)
+
+# Readable env key for checking where the key is loaded from. It is
+# hand-typed, so tests asserting an envelope format use a generated key.
+_ENV_MASTER_KEY = "dGVzdF9rZXlfZnJvbV9lbnYxMjM0NTY3ODkwMTIzNDU2"
+
+
+@pytest.fixture(scope="module")
+def shared_key():
+    """Master key shared by every test in this module."""
+    return TokenEncryption.generate_master_key()
+
+
+@pytest.fixture(scope="module")
+def shared_encryptor(shared_key):
+    """Encryptor built once from the shared master key."""
+    return TokenEncryption(master_key=shared_key)
+
 
 class TestTokenEncryption:
     """Test cases for TokenEncryption class."""
@@ -31,85 +72,53 @@ class TestTokenEncryption:
         encryptor = TokenEncryption(master_key=master_key)
         assert encryptor._master_key == master_key
 
-    @patch.dict(
-        os.environ,
-        {"PROXMOX_MCP_MASTER_KEY": "dGVzdF9rZXlfZnJvbV9lbnYxMjM0NTY3ODkwMTIzNDU2"},
-    )
-    def test_init_with_env_key(self):
+    def test_init_with_env_key(self, monkeypatch, capsys):
         """Test initialization with key from environment variable."""
+        monkeypatch.setenv("PROXMOX_MCP_MASTER_KEY", _ENV_MASTER_KEY)
         encryptor = TokenEncryption()
-        assert encryptor._master_key == "dGVzdF9rZXlfZnJvbV9lbnYxMjM0NTY3ODkwMTIzNDU2"
+        assert encryptor._master_key == _ENV_MASTER_KEY
+        # No generation warning when the key comes from the environment
+        assert capsys.readouterr().out == ""
 
-    @patch.dict(os.environ, {}, clear=True)
-    @patch("builtins.print")
-    def test_init_generates_new_key_when_no_env(self, mock_print):
-        """Test that a new key is generated when no environment variable is set."""
-        encryptor = TokenEncryption()
-        assert encryptor._master_key is not None
-        assert len(encryptor._master_key) > 0
-        # Verify warning was printed but key was NOT exposed
-        assert mock_print.called
-
-        # Check that no call to print contains the actual master key
-        for call_args in mock_print.call_args_list:
-            printed_text = str(call_args[0][0]) if call_args[0] else ""
-            # The master key should not appear in any print statement
-            assert encryptor._master_key not in printed_text
-
-        # Verify security messaging is included
-        printed_messages = [
-            str(call[0][0]) for call in mock_print.call_args_list if call[0]
-        ]
-        security_message_found = any(
-            "SECURITY" in msg or "security" in msg for msg in printed_messages
-        )
-        assert security_message_found, "Security warning should be displayed"
-
-        # Verify that the key itself is NOT printed to console
-        printed_calls = [str(call) for call in mock_print.call_args_list]
-        for call in printed_calls:
-            # Make sure the actual key value is not in any print statement
-            assert encryptor._master_key not in call
-
-    @patch.dict(os.environ, {}, clear=True)
-    @patch("builtins.print")
-    def test_key_not_exposed_in_auto_generation(self, mock_print):
-        """Test that auto-generated keys are not exposed in console output."""
+    def test_autogen_security_output(self, monkeypatch, capsys):
+        """Test that an auto-generated key warns the user without exposing the key."""
+        monkeypatch.delenv("PROXMOX_MCP_MASTER_KEY", raising=False)
         encryptor = TokenEncryption()
+        output = capsys.readouterr().out
 
-        # Get all the printed messages
-        printed_messages = []
-        for call_args in mock_print.call_args_list:
-            if call_args[0]:  # If there are positional arguments
-                printed_messages.append(call_args[0][0])  # First positional argument
+        # A usable session key was generated
+        assert encryptor._master_key
+        token = "test-token"  # nosec: test credential
+        assert encryptor.decrypt_token(encryptor.encrypt_token(token)) == token
 
-        # Join all messages and verify the key is not exposed
-        all_output = " ".join(printed_messages)
-        assert encryptor._master_key not in all_output
+        # The key itself never appears in console output
+        assert encryptor._master_key not in output
 
-        # Verify appropriate security warnings are shown
-        assert any("WARNING" in msg for msg in printed_messages)
-        assert any("temporary key" in msg for msg in printed_messages)
-        assert any("encrypt_config" in msg for msg in printed_messages)
+        # Security warnings and next steps are shown
+        assert (
+            "SECURITY" in output or "security" in output
+        ), "Security warning should be displayed"
+        assert "WARNING" in output
+        assert "temporary key" in output
+        assert "environment" in output
+        assert "encrypt_config" in output
 
-    def test_encrypt_decrypt_roundtrip_new_format(self):
+    def test_encrypt_decrypt_roundtrip_new_format(self, shared_encryptor):
         """Test that encryption and decryption work correctly with new format."""
-        master_key = TokenEncryption.generate_master_key()
-        encryptor = TokenEncryption(master_key=master_key)
+        encryptor = shared_encryptor
 
         original_token = "test-api-token-12345"  # nosec: test credential
         encrypted_token = encryptor.encrypt_token(original_token)
         decrypted_token = encryptor.decrypt_token(encrypted_token)
 
         assert decrypted_token == original_token
-        assert encrypted_token.startswith("enc:")
-        # New format should have salt and encrypted data separated by colons
-        assert encrypted_token.count(":") == 2
+        # Generated master keys are high-entropy, so tokens use the v2 envelope
+        # with version, salt and encrypted data separated by colons
+        assert _NEW_FORMAT_RE.fullmatch(encrypted_token)
 
-    def test_unique_salts_for_same_token(self):
+    def test_unique_salts_for_same_token(self, shared_encryptor):
         """Test that encrypting the same token twice generates different salts."""
-        master_key = TokenEncryption.generate_master_key()
-        encryptor = TokenEncryption(master_key=master_key)
+        encryptor = shared_encryptor
 
         token = "test-token"  # nosec: test credential
         encrypted1 = encryptor.encrypt_token(token)
@@ -123,14 +132,13 @@ class TestTokenEncryption:
         assert encrypted1 != encrypted2
 
         # Extract salts and verify they're different
-        salt1 = encrypted1.split(":")[1]
-        salt2 = encrypted2.split(":")[1]
+        salt1 = encrypted1.split(":")[2]
+        salt2 = encrypted2.split(":")[2]
         assert salt1 != salt2
 
-    def test_backward_compatibility_old_format(self):
+    def test_backward_compatibility_old_format(self, shared_encryptor):
         """Test that old format tokens (without salt) can still be decrypted."""
-        master_key = TokenEncryption.generate_master_key()
-        encryptor = TokenEncryption(master_key=master_key)
+        encryptor = shared_encryptor
 
         # Simulate an old format encrypted token (using static salt)
         original_token = "legacy-token"
@@ -145,16 +153,101 @@ class TestTokenEncryption:
         decrypted_token = encryptor.decrypt_token(old_format_token)
         assert decrypted_token == original_token
 
-    def test_decrypt_plain_text_token(self):
+    def test_static_cipher_derived_only_for_old_format(self):
+        """Test that the static-salt cipher is only derived for old format tokens."""
+        master_key = TokenEncryption.generate_master_key()
+        encryptor = TokenEncryption(master_key=master_key)
+
+        encrypted_token = encryptor.encrypt_token("token")  # nosec: test credential
+        assert encryptor.decrypt_token(encrypted_token) == "token"
+        assert "_cipher" not in vars(encryptor)
+
+        encrypted_bytes = encryptor._cipher.encrypt(b"legacy-token")
+        old_format_token = f"enc:{base64.urlsafe_b64encode(encrypted_bytes).decode()}"
+        assert encryptor.decrypt_token(old_format_token) == "legacy-token"
+        assert "_cipher" in vars(encryptor)
+
+    def test_repeated_decryption_reuses_derived_key(self):
+        """Test that decrypting the same stretched token derives its key only once."""
+        short_key = base64.urlsafe_b64encode(b"short-master-key").decode()
+        encryptor = TokenEncryption(master_key=short_key)
+        encrypted = encryptor.encrypt_token("token")  # nosec: test credential
+        misses = encryption._derive_key.cache_info().misses
+
+        assert encryptor.decrypt_token(encrypted) == "token"
+        assert encryptor.decrypt_token(encrypted) == "token"
+        assert encryption._derive_key.cache_info().misses == misses
+
+    def test_unstretched_derivation_not_cached(self, shared_encryptor):
+        """Test that v2 key material never enters the derivation cache."""
+        encryption._derive_key.cache_clear()
+
+        encrypted = shared_encryptor.encrypt_token("token")  # nosec: test credential
+        assert shared_encryptor.decrypt_token(encrypted) == "token"
+        assert encryption._derive_key.cache_info().currsize == 0
+
+    def test_clear_default_drops_derived_keys(self):
+        """Test that clear_default() also empties the derivation cache."""
+        short_key = base64.urlsafe_b64encode(b"short-master-key").decode()
+        TokenEncryption(master_key=short_key).encrypt_token("token")
+        assert encryption._derive_key.cache_info().currsize > 0
+
+        TokenEncryption.clear_default()
+        assert encryption._derive_key.cache_info().currsize == 0
+
+    def test_backward_compatibility_salted_format(self, shared_encryptor):
+        """Test that unversioned salted tokens still decrypt with the v1 count.
+
+        Runs at the session's reduced count; production-strength derivation
+        is covered by test_production_kdf_known_answer.
+        """
+        encryptor = shared_encryptor
+
+        # Simulate a token written before envelope versioning was introduced
+        original_token = "salted-token"  # nosec: test credential
+        salt = os.urandom(16)
+        cipher = encryptor._create_cipher(
+            salt, iterations=encryption._KDF_ITERATIONS["v1"]
+        )
+        encrypted_bytes = cipher.encrypt(original_token.encode())
+        salted_token = (
+            f"enc:{base64.urlsafe_b64encode(salt).decode()}:"
+            f"{base64.urlsafe_b64encode(encrypted_bytes).decode()}"
+        )
+
+        assert encryptor.decrypt_token(salted_token) == original_token
+
+    @pytest.mark.usefixtures("production_kdf")
+    @pytest.mark.parametrize(
+        "token", [_KAT_SALTED_TOKEN, _KAT_LEGACY_TOKEN], ids=["salted", "legacy"]
+    )
+    def test_production_kdf_known_answer(self, token):
+        """Test that existing enc: tokens decrypt with the shipped 100,000 rounds."""
+        encryptor = TokenEncryption(master_key=_KAT_MASTER_KEY)
+
+        assert encryptor.decrypt_token(token) == _KAT_PLAINTEXT
+
+    def test_short_master_key_uses_stretched_format(self):
+        """Test that low-entropy master keys keep the stretched unversioned format."""
+        short_key = base64.urlsafe_b64encode(b"short-master-key").decode()
+        encryptor = TokenEncryption(master_key=short_key)
+
+        token = "test-token"  # nosec: test credential
+        encrypted_token = encryptor.encrypt_token(token)
+
+        assert _SALTED_FORMAT_RE.fullmatch(encrypted_token)
+        assert encryptor.decrypt_token(encrypted_token) == token
+
+    def test_decrypt_plain_text_token(self, shared_encryptor):
         """Test that plain text tokens (without enc: prefix) are returned as-is."""
-        encryptor = TokenEncryption()
+        encryptor = shared_encryptor
         plain_token = "plain-text-token"  # nosec: test credential
         result = encryptor.decrypt_token(plain_token)
         assert result == plain_token
 
-    def test_is_encrypted(self):
+    def test_is_encrypted(self, shared_encryptor):
         """Test the is_encrypted method."""
-        encryptor = TokenEncryption()
+        encryptor = shared_encryptor
 
         # Test plain text token
         assert not encryptor.is_encrypted("plain-token")  # nosec: test credential
@@ -163,9 +256,9 @@ class TestTokenEncryption:
         encrypted = encryptor.encrypt_token("test-token")  # nosec: test credential
         assert encryptor.is_encrypted(encrypted)
 
-    def test_migrate_plain_token(self):
+    def test_migrate_plain_token(self, shared_encryptor):
         """Test migrating plain text token to encrypted format."""
-        encryptor = TokenEncryption()
+        encryptor = shared_encryptor
 
         plain_token = "plain-token"  # nosec: test credential
         migrated_token = encryptor.migrate_plain_token(plain_token)
@@ -181,14 +274,31 @@ class TestTokenEncryption:
         migrated_again = encryptor.migrate_plain_token(migrated_token)
         assert migrated_again == migrated_token
 
+    def test_migrate_batch(self, shared_encryptor):
+        """Test migrating several tokens at once preserves order and values."""
+        encryptor = shared_encryptor
+
+        already_encrypted = encryptor.encrypt_token("token-c")  # nosec: test credential
+        tokens = ["token-a", "token-b", already_encrypted]  # nosec: test credential
+        migrated = encryptor.migrate_batch(tokens, max_workers=2)
+
+        assert len(migrated) == 3
+        assert all(encryptor.is_encrypted(token) for token in migrated)
+        assert migrated[2] == already_encrypted
+        assert [encryptor.decrypt_token(token) for token in migrated] == [
+            "token-a",
+            "token-b",
+            "token-c",
+        ]
+
     def test_invalid_master_key(self):
         """Test that invalid master keys raise appropriate errors."""
         with pytest.raises(ValueError, match="Invalid master key"):
             TokenEncryption(master_key="invalid-key")
 
-    def test_invalid_encrypted_token_format(self):
+    def test_invalid_encrypted_token_format(self, shared_encryptor):
         """Test that invalid encrypted token formats raise appropriate errors."""
-        encryptor = TokenEncryption()
+        encryptor = shared_encryptor
 
         # Invalid format (too many colons)
         with pytest.raises(ValueError, match="Failed to decrypt token"):
@@ -207,17 +317,15 @@ class TestTokenEncryption:
         assert key1 != key2
 
         # Keys should be valid base64
-        assert base64.urlsafe_b64decode(key1.encode())
-        assert base64.urlsafe_b64decode(key2.encode())
+        for key in (key1, key2):
+            assert _B64URL_RE.fullmatch(key) and len(key) % 4 == 0
 
-    def test_different_encryptors_same_master_key(self):
+    def test_different_encryptors_same_master_key(self, shared_key, shared_encryptor):
         """Test that different encryptor instances with same master key can decrypt each
         other's tokens.
         """
-        master_key = TokenEncryption.generate_master_key()
-
-        encryptor1 = TokenEncryption(master_key=master_key)
-        encryptor2 = TokenEncryption(master_key=master_key)
+        encryptor1 = shared_encryptor
+        encryptor2 = TokenEncryption(master_key=shared_key)
 
         token = "shared-token"  # nosec: test credential
         encrypted_by_1 = encryptor1.encrypt_token(token)
@@ -229,33 +337,48 @@ class TestTokenEncryption:
 class TestConvenienceFunctions:
     """Test cases for convenience functions."""
 
-    def test_encrypt_sensitive_value(self):
+    def test_encrypt_sensitive_value(self, monkeypatch, shared_key):
         """Test encrypt_sensitive_value convenience function."""
+        monkeypatch.setenv("PROXMOX_MCP_MASTER_KEY", shared_key)
         value = "sensitive-value"
         encrypted = encrypt_sensitive_value(value)
 
-        assert encrypted.startswith("enc:")
-        assert encrypted.count(":") == 2  # New format
+        assert _NEW_FORMAT_RE.fullmatch(encrypted)  # Versioned format
 
-    @patch.dict(
-        os.environ,
-        {"PROXMOX_MCP_MASTER_KEY": "dGVzdF9rZXlfZnJvbV9lbnYxMjM0NTY3ODkwMTIzNDU2"},
-    )
-    def test_decrypt_sensitive_value(self):
+    def test_decrypt_sensitive_value(self, monkeypatch, shared_key):
         """Test decrypt_sensitive_value convenience function."""
+        monkeypatch.setenv("PROXMOX_MCP_MASTER_KEY", shared_key)
         value = "sensitive-value"
         encrypted = encrypt_sensitive_value(value)
         decrypted = decrypt_sensitive_value(encrypted)
 
         assert decrypted == value
 
-    def test_convenience_functions_with_custom_encryptor(self):
-        """Test convenience functions with custom encryptor."""
-        master_key = TokenEncryption.generate_master_key()
-        encryptor = TokenEncryption(master_key=master_key)
+    def test_default_encryptor_memoized_per_env_key(self, monkeypatch):
+        """Test that the shared encryptor is reused until the env key changes."""
+        key1 = TokenEncryption.generate_master_key()
+        key2 = TokenEncryption.generate_master_key()
+
+        monkeypatch.setenv("PROXMOX_MCP_MASTER_KEY", key1)
+        first = TokenEncryption.default()
+        assert TokenEncryption.default() is first
+        assert first._master_key == key1
 
+        monkeypatch.setenv("PROXMOX_MCP_MASTER_KEY", key2)
+        rotated = TokenEncryption.default()
+        assert rotated is not first
+        assert rotated._master_key == key2
+
+        # Only the encryptor for the current key is retained
+        assert list(TokenEncryption._default_cache) == [key2]
+
+        TokenEncryption.clear_default()
+        assert not TokenEncryption._default_cache
+
+    def test_convenience_functions_with_custom_encryptor(self, shared_encryptor):
+        """Test convenience functions with custom encryptor."""
         value = "test-value"
-        encrypted = encrypt_sensitive_value(value, encryptor)
-        decrypted = decrypt_sensitive_value(encrypted, encryptor)
+        encrypted = encrypt_sensitive_value(value, shared_encryptor)
+        decrypted = decrypt_sensitive_value(encrypted, shared_encryptor)
 
         assert decrypted == value
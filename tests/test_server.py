@@ -3,73 +3,197 @@ Tests for the Proxmox MCP server.
 """
 
 import json
-import os
-import tempfile
-from unittest.mock import patch
+from types import MappingProxyType
 
 from mcp.server.fastmcp.exceptions import ToolError
 import pytest
+import pytest_asyncio
 
 from proxmox_mcp.server import ProxmoxMCPServer
 
+# Read-only call_tool arguments shared across tests
+ARGS_NONE = MappingProxyType({})
+ARGS_NODE = MappingProxyType({"node": "node1"})
+ARGS_EXEC = MappingProxyType({"node": "node1", "vmid": "100", "command": "ls -l"})
+ARGS_EXEC_INVALID = MappingProxyType(
+    {"node": "node1", "vmid": "100", "command": "invalid-command"}
+)
+
+CONFIG_DATA = {
+    "proxmox": {"host": "test.proxmox.com", "port": 8006, "verify_ssl": False},
+    "auth": {
+        "user": "test@pve",
+        "token_name": "test_token",  # nosec: test credential
+        "token_value": "test_value",  # nosec: test credential
+    },
+    "logging": {"level": "DEBUG"},
+}
+
+# Canned API responses shared by the listing tests. Tuples keep the seeds from
+# being mutated by one test and leaking into the next.
+NODES_DEFAULT = (
+    {"node": "node1", "status": "online"},
+    {"node": "node2", "status": "online"},
+)
+NODES_SINGLE = NODES_DEFAULT[:1]
+NODE_STATUS_1 = {
+    "uptime": 123456,
+    "cpuinfo": {"cpus": 8},
+    "memory": {"used": 8000000000, "total": 16000000000},
+}
+NODE_STATUS_2 = {
+    "uptime": 654321,
+    "cpuinfo": {"cpus": 16},
+    "memory": {"used": 12000000000, "total": 32000000000},
+}
+VM_LIST = (
+    {
+        "vmid": "100",
+        "name": "vm1",
+        "status": "running",
+        "mem": 2000000000,
+        "maxmem": 4000000000,
+    },
+    {
+        "vmid": "101",
+        "name": "vm2",
+        "status": "stopped",
+        "mem": 0,
+        "maxmem": 2000000000,
+    },
+)
+VM_CONFIGS = ({"cores": 2}, {"cores": 4})
+CONTAINER_LIST = (
+    {
+        "vmid": "200",
+        "name": "container1",
+        "status": "running",
+        "mem": 1000000000,
+        "maxmem": 2000000000,
+    },
+    {
+        "vmid": "201",
+        "name": "container2",
+        "status": "stopped",
+        "mem": 0,
+        "maxmem": 1000000000,
+    },
+)
+CONTAINER_CONFIGS = (
+    {"cores": 2, "ostemplate": "ubuntu-20.04"},
+    {"cores": 1, "ostemplate": "debian-11"},
+)
+STORAGE_LIST = (
+    {"storage": "local", "type": "dir", "enabled": True},
+    {"storage": "ceph", "type": "rbd", "enabled": True},
+)
+STORAGE_STATUS_1 = {
+    "used": 500000000000,
+    "total": 1000000000000,
+    "avail": 500000000000,
+}
+STORAGE_STATUS_2 = {
+    "used": 2000000000000,
+    "total": 5000000000000,
+    "avail": 3000000000000,
+}
+
+
+TEST_ENV = {
+    "PROXMOX_HOST": "test.proxmox.com",
+    "PROXMOX_USER": "test@pve",
+    "PROXMOX_TOKEN_NAME": "test_token",  # nosec: test credential
+    "PROXMOX_TOKEN_VALUE": "test_value",  # nosec: test credential
+    "LOG_LEVEL": "DEBUG",
+}
+
+
+@pytest.fixture(scope="session")
+def temp_config_file(tmp_path_factory):
+    """Write the test config file once per session."""
+    config_path = tmp_path_factory.mktemp("config") / "config.json"
+    config_path.write_text(json.dumps(CONFIG_DATA))
+    return str(config_path)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def mock_env_vars(temp_config_file):
+    """Set the test environment, including PROXMOX_MCP_CONFIG, for this module.
+
+    Module scope keeps the variables from leaking into modules collected later.
+    """
+    # The built-in monkeypatch fixture is function-scoped
+    with pytest.MonkeyPatch.context() as mp:
+        for key, value in TEST_ENV.items():
+            mp.setenv(key, value)
+        mp.setenv("PROXMOX_MCP_CONFIG", temp_config_file)
+        yield TEST_ENV
+
+
+@pytest.fixture(scope="module")
+def _server_module(temp_config_file, proxmox_api_class):
+    """Build the ProxmoxMCPServer once for all tests in this module."""
+    # Count only the builds made by this module's server
+    proxmox_api_class.instantiation_count = 0
+    return ProxmoxMCPServer(config_path=temp_config_file)
+
 
 @pytest.fixture
-def mock_env_vars():
-    """Fixture to set up test environment variables."""
-    env_vars = {
-        "PROXMOX_HOST": "test.proxmox.com",
-        "PROXMOX_USER": "test@pve",
-        "PROXMOX_TOKEN_NAME": "test_token",  # nosec: test credential
-        "PROXMOX_TOKEN_VALUE": "test_value",  # nosec: test credential
-        "LOG_LEVEL": "DEBUG",
-    }
-    with patch.dict(os.environ, env_vars):
-        yield env_vars
+def mock_proxmox(_server_module, proxmox_stub):
+    """Fixture providing the stub ProxmoxAPI, reset to its defaults for each test."""
+    proxmox_stub.nodes.get.result = NODES_DEFAULT
+    return proxmox_stub
 
 
-@pytest.fixture
-def temp_config_file(mock_env_vars):
-    """Create a temporary config file for testing."""
-    config_data = {
-        "proxmox": {"host": "test.proxmox.com", "port": 8006, "verify_ssl": False},
-        "auth": {
-            "user": "test@pve",
-            "token_name": "test_token",  # nosec: test credential
-            "token_value": "test_value",  # nosec: test credential
-        },
-        "logging": {"level": "DEBUG"},
-    }
+def _seed_nodes(api):
+    api.feed("nodes.status.get", (NODE_STATUS_1, NODE_STATUS_2))
+
 
-    with tempfile.NamedTemporaryFile(mode="w", suffix=".json", delete=False) as f:
-        json.dump(config_data, f)
-        config_path = f.name
+def _seed_vms(api):
+    api.nodes.get.result = NODES_SINGLE
+    api.nodes.qemu.get.result = VM_LIST
+    api.feed("nodes.qemu.config.get", VM_CONFIGS)
 
-    # Set the config path environment variable
-    with patch.dict(os.environ, {"PROXMOX_MCP_CONFIG": config_path}):
-        yield config_path
 
-    # Clean up
-    os.unlink(config_path)
+def _seed_containers(api):
+    api.nodes.get.result = NODES_SINGLE
+    api.nodes.lxc.get.result = CONTAINER_LIST
+    api.feed("nodes.lxc.config.get", CONTAINER_CONFIGS)
+
+
+def _seed_storage(api):
+    api.storage.get.result = STORAGE_LIST
+    api.feed("nodes.storage.status.get", (STORAGE_STATUS_1, STORAGE_STATUS_2))
+
+
+_SEEDS = {
+    "nodes": _seed_nodes,
+    "vms": _seed_vms,
+    "containers": _seed_containers,
+    "storage": _seed_storage,
+}
 
 
 @pytest.fixture
-def mock_proxmox():
-    """Fixture to mock ProxmoxAPI."""
-    with patch("proxmox_mcp.core.proxmox.ProxmoxAPI") as mock:
-        mock.return_value.nodes.get.return_value = [
-            {"node": "node1", "status": "online"},
-            {"node": "node2", "status": "online"},
-        ]
-        yield mock
+def seeded_stub(mock_proxmox, request):
+    """Install the seed set named by the indirect parameter on the API stub."""
+    _SEEDS[request.param](mock_proxmox)
+    return mock_proxmox
+
+
+@pytest_asyncio.fixture(scope="module")
+async def tools(_server_module):
+    """Tool listing of the shared server, enumerated once per module."""
+    return await _server_module.mcp.list_tools()
 
 
 @pytest.fixture
-def server(temp_config_file, mock_proxmox):
-    """Fixture to create a ProxmoxMCPServer instance."""
-    return ProxmoxMCPServer(config_path=temp_config_file)
+def server(_server_module, mock_proxmox):
+    """Fixture providing the shared ProxmoxMCPServer with a fresh API stub."""
+    return _server_module
 
 
-def test_server_initialization(server, mock_proxmox):
+def test_server_initialization(server, proxmox_api_class):
     """Test server initialization with environment variables."""
     assert server.config.proxmox.host == "test.proxmox.com"
     assert server.config.auth.user == "test@pve"
@@ -77,14 +201,11 @@ def test_server_initialization(server, mock_proxmox):
     assert server.config.auth.token_value == "test_value"
     assert server.config.logging.level == "DEBUG"
 
-    mock_proxmox.assert_called_once()
+    assert proxmox_api_class.instantiation_count == 1
 
 
-@pytest.mark.asyncio
-async def test_list_tools(server):
+def test_list_tools(tools):
     """Test listing available tools."""
-    tools = await server.mcp.list_tools()
-
     assert len(tools) > 0
     tool_names = [tool.name for tool in tools]
     assert "get_nodes" in tool_names
@@ -94,33 +215,10 @@ async def test_list_tools(server):
 
 
 @pytest.mark.asyncio
-async def test_get_nodes(server, mock_proxmox):
+@pytest.mark.parametrize("seeded_stub", ["nodes"], indirect=True)
+async def test_get_nodes(server, seeded_stub):
     """Test get_nodes tool."""
-    # Mock the API chain properly
-    mock_proxmox.return_value.nodes.get.return_value = [
-        {"node": "node1", "status": "online"},
-        {"node": "node2", "status": "online"},
-    ]
-
-    # Mock detailed node status calls with proper data types
-    mock_status_1 = {
-        "uptime": 123456,
-        "cpuinfo": {"cpus": 8},
-        "memory": {"used": 8000000000, "total": 16000000000},
-    }
-    mock_status_2 = {
-        "uptime": 654321,
-        "cpuinfo": {"cpus": 16},
-        "memory": {"used": 12000000000, "total": 32000000000},
-    }
-
-    # Set up the mocking chain for node status calls
-    mock_proxmox.return_value.nodes.return_value.status.get.side_effect = [
-        mock_status_1,
-        mock_status_2,
-    ]
-
-    response = await server.mcp.call_tool("get_nodes", {})
+    response = await server.mcp.call_tool("get_nodes", ARGS_NONE)
 
     # The response should be formatted text, not JSON
     assert len(response) == 1
@@ -132,21 +230,23 @@ async def test_get_nodes(server, mock_proxmox):
 @pytest.mark.asyncio
 async def test_get_node_status_missing_parameter(server):
     """Test get_node_status tool with missing parameter."""
-    with pytest.raises(ToolError, match="Field required"):
-        await server.mcp.call_tool("get_node_status", {})
+    with pytest.raises(ToolError) as exc_info:
+        await server.mcp.call_tool("get_node_status", ARGS_NONE)
+
+    assert "Field required" in str(exc_info.value)
 
 
 @pytest.mark.asyncio
 async def test_get_node_status(server, mock_proxmox):
     """Test get_node_status tool with valid parameter."""
-    mock_proxmox.return_value.nodes.return_value.status.get.return_value = {
+    mock_proxmox.nodes.status.get.result = {
         "status": "running",
         "uptime": 123456,
         "cpuinfo": {"cpus": 4},
         "memory": {"used": 4000000000, "total": 8000000000},
     }
 
-    response = await server.mcp.call_tool("get_node_status", {"node": "node1"})
+    response = await server.mcp.call_tool("get_node_status", ARGS_NODE)
 
     # The response should be formatted text, not JSON
     assert len(response) == 1
@@ -155,37 +255,10 @@ async def test_get_node_status(server, mock_proxmox):
 
 
 @pytest.mark.asyncio
-async def test_get_vms(server, mock_proxmox):
+@pytest.mark.parametrize("seeded_stub", ["vms"], indirect=True)
+async def test_get_vms(server, seeded_stub):
     """Test get_vms tool."""
-    mock_proxmox.return_value.nodes.get.return_value = [
-        {"node": "node1", "status": "online"}
-    ]
-    mock_proxmox.return_value.nodes.return_value.qemu.get.return_value = [
-        {
-            "vmid": "100",
-            "name": "vm1",
-            "status": "running",
-            "mem": 2000000000,
-            "maxmem": 4000000000,
-        },
-        {
-            "vmid": "101",
-            "name": "vm2",
-            "status": "stopped",
-            "mem": 0,
-            "maxmem": 2000000000,
-        },
-    ]
-
-    # Mock VM config calls for CPU cores
-    mock_config_1 = {"cores": 2}
-    mock_config_2 = {"cores": 4}
-    mock_proxmox.return_value.nodes.return_value.qemu.return_value.config.get.side_effect = [
-        mock_config_1,
-        mock_config_2,
-    ]
-
-    response = await server.mcp.call_tool("get_vms", {})
+    response = await server.mcp.call_tool("get_vms", ARGS_NONE)
 
     # The response should be formatted text, not JSON
     assert len(response) == 1
@@ -195,37 +268,10 @@ async def test_get_vms(server, mock_proxmox):
 
 
 @pytest.mark.asyncio
-async def test_get_containers(server, mock_proxmox):
+@pytest.mark.parametrize("seeded_stub", ["containers"], indirect=True)
+async def test_get_containers(server, seeded_stub):
     """Test get_containers tool."""
-    mock_proxmox.return_value.nodes.get.return_value = [
-        {"node": "node1", "status": "online"}
-    ]
-    mock_proxmox.return_value.nodes.return_value.lxc.get.return_value = [
-        {
-            "vmid": "200",
-            "name": "container1",
-            "status": "running",
-            "mem": 1000000000,
-            "maxmem": 2000000000,
-        },
-        {
-            "vmid": "201",
-            "name": "container2",
-            "status": "stopped",
-            "mem": 0,
-            "maxmem": 1000000000,
-        },
-    ]
-
-    # Mock container config calls for CPU cores and template
-    mock_config_1 = {"cores": 2, "ostemplate": "ubuntu-20.04"}
-    mock_config_2 = {"cores": 1, "ostemplate": "debian-11"}
-    mock_proxmox.return_value.nodes.return_value.lxc.return_value.config.get.side_effect = [
-        mock_config_1,
-        mock_config_2,
-    ]
-
-    response = await server.mcp.call_tool("get_containers", {})
+    response = await server.mcp.call_tool("get_containers", ARGS_NONE)
 
     # The response should be formatted text, not JSON
     assert len(response) == 1
@@ -235,30 +281,10 @@ async def test_get_containers(server, mock_proxmox):
 
 
 @pytest.mark.asyncio
-async def test_get_storage(server, mock_proxmox):
+@pytest.mark.parametrize("seeded_stub", ["storage"], indirect=True)
+async def test_get_storage(server, seeded_stub):
     """Test get_storage tool."""
-    mock_proxmox.return_value.storage.get.return_value = [
-        {"storage": "local", "type": "dir", "enabled": True},
-        {"storage": "ceph", "type": "rbd", "enabled": True},
-    ]
-
-    # Mock storage status calls with proper numeric types
-    mock_status_1 = {
-        "used": 500000000000,
-        "total": 1000000000000,
-        "avail": 500000000000,
-    }
-    mock_status_2 = {
-        "used": 2000000000000,
-        "total": 5000000000000,
-        "avail": 3000000000000,
-    }
-    mock_proxmox.return_value.nodes.return_value.storage.return_value.status.get.side_effect = [
-        mock_status_1,
-        mock_status_2,
-    ]
-
-    response = await server.mcp.call_tool("get_storage", {})
+    response = await server.mcp.call_tool("get_storage", ARGS_NONE)
 
     # The response should be formatted text, not JSON
     assert len(response) == 1
@@ -270,13 +296,13 @@ async def test_get_storage(server, mock_proxmox):
 @pytest.mark.asyncio
 async def test_get_cluster_status(server, mock_proxmox):
     """Test get_cluster_status tool."""
-    mock_proxmox.return_value.cluster.status.get.return_value = [
+    mock_proxmox.cluster.status.get.result = [
         {"name": "test-cluster", "type": "cluster", "quorate": 1},
         {"name": "node1", "type": "node", "online": 1},
         {"name": "node2", "type": "node", "online": 1},
     ]
 
-    response = await server.mcp.call_tool("get_cluster_status", {})
+    response = await server.mcp.call_tool("get_cluster_status", ARGS_NONE)
 
     # The response should be formatted text, not JSON
     assert len(response) == 1
@@ -285,80 +311,74 @@ async def test_get_cluster_status(server, mock_proxmox):
 
 
 @pytest.mark.asyncio
-async def test_execute_vm_command_success(server, mock_proxmox):
-    """Test successful VM command execution."""
-    # Mock VM status check
-    mock_status = mock_proxmox.return_value.nodes.return_value.qemu.return_value.status
-    mock_status.current.get.return_value = {"status": "running"}
-
-    # Mock the two-phase command execution
-    # Phase 1: exec returns PID
-    mock_agent = mock_proxmox.return_value.nodes.return_value.qemu.return_value.agent
-    mock_agent.return_value.post.return_value = {"pid": 12345}
-
-    # Phase 2: exec-status returns results
-    mock_agent.return_value.get.return_value = {
-        "out-data": "command output",
-        "err-data": "",
-        "exitcode": 0,
-        "exited": 1,
-    }
-
-    response = await server.mcp.call_tool(
-        "execute_vm_command", {"node": "node1", "vmid": "100", "command": "ls -l"}
-    )
+@pytest.mark.parametrize(
+    "args,vm_status,exec_post,exec_status,expected,error",
+    [
+        pytest.param(
+            ARGS_EXEC,
+            {"status": "running"},
+            {"pid": 12345},
+            {"out-data": "command output", "err-data": "", "exitcode": 0, "exited": 1},
+            "command output",
+            None,
+            id="success",
+        ),
+        pytest.param(
+            ARGS_NONE,
+            None,
+            None,
+            None,
+            None,
+            "Field required",
+            id="missing_parameters",
+        ),
+        pytest.param(
+            ARGS_EXEC,
+            {"status": "stopped"},
+            None,
+            None,
+            None,
+            "not running",
+            id="vm_not_running",
+        ),
+        pytest.param(
+            ARGS_EXEC_INVALID,
+            {"status": "running"},
+            {"pid": 12346},
+            {
+                "out-data": "",
+                "err-data": "command not found",
+                "exitcode": 1,
+                "exited": 1,
+            },
+            "command not found",
+            None,
+            id="with_error",
+        ),
+    ],
+)
+async def test_execute_vm_command(
+    server, mock_proxmox, args, vm_status, exec_post, exec_status, expected, error
+):
+    """Test VM command execution across success and failure scenarios."""
+    mock_proxmox.nodes.qemu.status.current.get.result = vm_status
+    # Two-phase execution: exec returns a PID, exec-status returns the result
+    mock_proxmox.nodes.qemu.agent.post.result = exec_post
+    mock_proxmox.nodes.qemu.agent.get.result = exec_status
+
+    if error is not None:
+        with pytest.raises(ToolError) as exc_info:
+            await server.mcp.call_tool("execute_vm_command", args)
+        assert error in str(exc_info.value)
+        return
+
+    response = await server.mcp.call_tool("execute_vm_command", args)
 
     # The response should be formatted text, not JSON
     assert len(response) == 1
-    assert "Command Output" in response[0].text or "command output" in response[0].text
+    assert "Command Output" in response[0].text or expected in response[0].text
 
-
-@pytest.mark.asyncio
-async def test_execute_vm_command_missing_parameters(server):
-    """Test VM command execution with missing parameters."""
-    with pytest.raises(ToolError):
-        await server.mcp.call_tool("execute_vm_command", {})
-
-
-@pytest.mark.asyncio
-async def test_execute_vm_command_vm_not_running(server, mock_proxmox):
-    """Test VM command execution when VM is not running."""
-    mock_status = mock_proxmox.return_value.nodes.return_value.qemu.return_value.status
-    mock_status.current.get.return_value = {"status": "stopped"}
-
-    with pytest.raises(ToolError, match="not running"):
-        await server.mcp.call_tool(
-            "execute_vm_command", {"node": "node1", "vmid": "100", "command": "ls -l"}
-        )
-
-
-@pytest.mark.asyncio
-async def test_execute_vm_command_with_error(server, mock_proxmox):
-    """Test VM command execution with command error."""
-    # Mock VM status check
-    mock_status = mock_proxmox.return_value.nodes.return_value.qemu.return_value.status
-    mock_status.current.get.return_value = {"status": "running"}
-
-    # Mock the two-phase command execution
-    # Phase 1: exec returns PID
-    mock_agent = mock_proxmox.return_value.nodes.return_value.qemu.return_value.agent
-    mock_agent.return_value.post.return_value = {"pid": 12346}
-
-    # Phase 2: exec-status returns error results
-    mock_agent.return_value.get.return_value = {
-        "out-data": "",
-        "err-data": "command not found",
-        "exitcode": 1,
-        "exited": 1,
-    }
-
-    response = await server.mcp.call_tool(
-        "execute_vm_command",
-        {"node": "node1", "vmid": "100", "command": "invalid-command"},
-    )
-
-    # The response should be formatted text, not JSON
-    assert len(response) == 1
-    assert (
-        "Command Output" in response[0].text or "command not found" in response[0].text
-    )
+    agent = mock_proxmox.nodes.qemu.agent
+    assert agent.calls == [("exec",), ("exec-status",)]
+    assert agent.post.calls == [((), {"command": args["command"]})]
+    assert agent.get.calls == [((), {"pid": exec_post["pid"]})]
@@ -2,60 +2,35 @@
 Tests for VM console operations.
 """
 
-from unittest.mock import Mock
-
 import pytest
 
 from proxmox_mcp.tools.console import VMConsoleManager
 
 
 @pytest.fixture
-def mock_proxmox():
-    """Fixture to create a mock ProxmoxAPI instance."""
-    mock = Mock()
-    # Setup chained mock calls for VM status check
-    mock.nodes.return_value.qemu.return_value.status.current.get.return_value = {
-        "status": "running"
-    }
-
-    # Setup agent endpoint
-    agent_mock = mock.nodes.return_value.qemu.return_value.agent
-
-    # Mock exec endpoint - returns PID
-    exec_mock = Mock()
-    exec_mock.post.return_value = {"pid": 12345}
-    agent_mock.return_value = exec_mock
-
-    # Mock exec-status endpoint - returns command result
-    exec_status_mock = Mock()
-    exec_status_mock.get.return_value = {
+def px(proxmox_stub):
+    """Fixture providing the stub ProxmoxAPI for a running VM."""
+    vm = proxmox_stub.nodes.qemu
+    vm.status.current.get.result = {"status": "running"}
+    # Two-phase execution: exec returns a PID, exec-status returns the result
+    vm.agent.post.result = {"pid": 12345}
+    vm.agent.get.result = {
         "out-data": "command output",
         "err-data": "",
         "exitcode": 0,
         "exited": 1,
     }
-
-    # Set up the agent call chain
-    def agent_endpoint(endpoint_name):
-        if endpoint_name == "exec":
-            return exec_mock
-        elif endpoint_name == "exec-status":
-            return exec_status_mock
-        return Mock()
-
-    agent_mock.side_effect = agent_endpoint
-
-    return mock
+    return proxmox_stub
 
 
 @pytest.fixture
-def vm_console(mock_proxmox):
+def vm_console(px):
     """Fixture to create a VMConsoleManager instance."""
-    return VMConsoleManager(mock_proxmox)
+    return VMConsoleManager(px)
 
 
 @pytest.mark.asyncio
-async def test_execute_command_success(vm_console, mock_proxmox):
+async def test_execute_command_success(vm_console, px):
     """Test successful command execution."""
     result = await vm_console.execute_command("node1", "100", "ls -l")
 
@@ -65,75 +40,59 @@ async def test_execute_command_success(vm_console, mock_proxmox):
     assert result["exit_code"] == 0
 
     # Verify correct API calls
-    mock_proxmox.nodes.assert_called_with("node1")
-    mock_proxmox.nodes.return_value.qemu.assert_called_with("100")
+    assert px.nodes.calls[-1] == ("node1",)
+    assert px.nodes.qemu.calls[-1] == ("100",)
+
+    # exec starts the command, exec-status is polled with the returned PID
+    agent = px.nodes.qemu.agent
+    assert agent.calls == [("exec",), ("exec-status",)]
+    assert agent.post.calls == [((), {"command": "ls -l"})]
+    assert agent.get.calls == [((), {"pid": 12345})]
 
 
 @pytest.mark.asyncio
-async def test_execute_command_vm_not_running(vm_console, mock_proxmox):
+async def test_execute_command_vm_not_running(vm_console, px):
     """Test command execution on stopped VM."""
-    mock_proxmox.nodes.return_value.qemu.return_value.status.current.get.return_value = {
-        "status": "stopped"
-    }
+    px.nodes.qemu.status.current.get.result = {"status": "stopped"}
 
-    with pytest.raises(ValueError, match="not running"):
+    with pytest.raises(ValueError) as exc_info:
         await vm_console.execute_command("node1", "100", "ls -l")
 
+    assert "not running" in str(exc_info.value)
+
 
 @pytest.mark.asyncio
-async def test_execute_command_vm_not_found(vm_console, mock_proxmox):
+async def test_execute_command_vm_not_found(vm_console, px):
     """Test command execution on non-existent VM."""
-    mock_proxmox.nodes.return_value.qemu.return_value.status.current.get.side_effect = (
-        Exception("VM not found")
-    )
+    px.nodes.qemu.status.current.get.error = Exception("VM not found")
 
-    with pytest.raises(ValueError, match="not found"):
+    with pytest.raises(ValueError) as exc_info:
         await vm_console.execute_command("node1", "100", "ls -l")
 
+    assert "not found" in str(exc_info.value)
+
 
 @pytest.mark.asyncio
-async def test_execute_command_failure(vm_console, mock_proxmox):
+async def test_execute_command_failure(vm_console, px):
     """Test command execution failure."""
-    # Override the agent mock to raise an exception on exec
-    agent_mock = mock_proxmox.nodes.return_value.qemu.return_value.agent
-
-    def agent_endpoint_failure(endpoint_name):
-        if endpoint_name == "exec":
-            exec_mock = Mock()
-            exec_mock.post.side_effect = Exception("Command failed")
-            return exec_mock
-        return Mock()
+    px.nodes.qemu.agent.post.error = Exception("Command failed")
 
-    agent_mock.side_effect = agent_endpoint_failure
-
-    with pytest.raises(RuntimeError, match="Failed to execute command"):
+    with pytest.raises(RuntimeError) as exc_info:
         await vm_console.execute_command("node1", "100", "ls -l")
 
+    assert "Failed to execute command" in str(exc_info.value)
+
 
 @pytest.mark.asyncio
-async def test_execute_command_with_error_output(vm_console, mock_proxmox):
+async def test_execute_command_with_error_output(vm_console, px):
     """Test command execution with error output."""
-    # Override the default exec-status mock for this test
-    agent_mock = mock_proxmox.nodes.return_value.qemu.return_value.agent
-    exec_status_mock = Mock()
-    exec_status_mock.get.return_value = {
+    px.nodes.qemu.agent.get.result = {
         "out-data": "",
         "err-data": "command error",
         "exitcode": 1,
         "exited": 1,
     }
 
-    def agent_endpoint(endpoint_name):
-        if endpoint_name == "exec":
-            exec_mock = Mock()
-            exec_mock.post.return_value = {"pid": 12345}
-            return exec_mock
-        elif endpoint_name == "exec-status":
-            return exec_status_mock
-        return Mock()
-
-    agent_mock.side_effect = agent_endpoint
-
     result = await vm_console.execute_command("node1", "100", "invalid-command")
 
     assert result["success"] is True  # Success refers to API call, not command